@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from jsonschema import validate
+from jsonschema.exceptions import ValidationError
+from transaction import Transaction, transaction_schema
+from peer_communication import broadcast_transaction
+
+class AdmissionPipeline:
+    """Validates submitted transactions in batches off the event loop.
+
+    Handlers submit raw transaction data into a bounded queue and await the
+    result. Worker tasks drain up to batch_size submissions at a time and run
+    schema checks, hashing, state checks and signature verification on a thread
+    pool, so at most `workers` batches are in flight. Pool insertion and the
+    result hand-off stay on the event loop.
+    """
+
+    def __init__(self, storage_engine, validation_engine, transactionpool, workers, queue_size, batch_size):
+        self.storage_engine = storage_engine
+        self.validation_engine = validation_engine
+        self.transactionpool = transactionpool
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.executor = None
+        self.tasks = []
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='admission')
+        self.tasks = [asyncio.create_task(self.run_worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def submit(self, transaction_data, sender_uri):
+        """Queues a submission and returns a future for its result.
+
+        Raises asyncio.QueueFull when the queue is at capacity. The future
+        resolves to the admitted Transaction, or None when it was rejected. It
+        raises ValueError when the transaction pool is full and RuntimeError
+        when validation itself failed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((transaction_data, sender_uri, future))
+        return future
+
+    async def run_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            # Clients that disconnected while queued have cancelled their futures
+            batch = [submission for submission in batch if not submission[2].done()]
+            if not batch:
+                continue
+            try:
+                transactions = await loop.run_in_executor(self.executor, self.validate_batch, [submission[0] for submission in batch], self.storage_engine.get_read_view())
+            except Exception as e:
+                logging.error(f"Failed to validate transaction batch: {e}")
+                # The submissions were not judged, so they must not be reported as invalid
+                for submission in batch:
+                    if not submission[2].done():
+                        submission[2].set_exception(RuntimeError("Transaction validation failed"))
+                continue
+            for (transaction_data, sender_uri, future), transaction in zip(batch, transactions):
+                self.admit(transaction, sender_uri, future)
+
+    def validate_batch(self, batch, reader):
+        transactions = []
+        for transaction_data in batch:
+            try:
+                validate(instance=transaction_data, schema=transaction_schema)
+                transactions.append(Transaction(**transaction_data))
+            except (ValidationError, TypeError):
+                transactions.append(None)
+        parsed = [transaction for transaction in transactions if transaction is not None]
+        results = iter(self.validation_engine.validate_transactions(parsed, reader))
+        return [transaction if transaction is not None and next(results) else None for transaction in transactions]
+
+    def admit(self, transaction, sender_uri, future):
+        if transaction is not None:
+            if transaction.transaction_hash in self.transactionpool.transactions:
+                transaction = None
+            else:
+                try:
+                    self.transactionpool.add_transaction(transaction)
+                except ValueError as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+                # Peers are contacted with blocking requests, so relaying stays off the loop
+                asyncio.get_running_loop().run_in_executor(None, broadcast_transaction, transaction, sender_uri)
+        if not future.done():
+            future.set_result(transaction)
@@ -138,10 +138,7 @@ class Block:
 
         return cls(header, transactions)
 
-    def store(self, storage_engine, new_state):
-        if self.header.has_enough_signatures(required_signatures=2/3 * len(storage_engine.fetch_current_validator_set())):
-            storage_engine.store_block(self)
-            storage_engine.store_block_header(self.header)
-            storage_engine.store_state(self.header.state_root, new_state)
-            return True
+    def store(self, storage_engine, new_state, state_trie=None):
+        if self.header.has_enough_signatures(required_signatures=storage_engine.fetch_validator_set().quorum):
+            return storage_engine.commit_block(self, new_state, state_trie)
         return False
@@ -0,0 +1,84 @@
+import mmap
+import os
+import struct
+
+# A segment is a sequence of records: a '>I' length followed by the encoded block.
+# Locations point at the block bytes, past the length prefix.
+RECORD_HEADER = struct.Struct('>I')
+LOCATION = struct.Struct('>IQI')
+
+class SegmentBlockStore:
+    """Append-only block bodies in segment files, read back through mmap.
+
+    Blocks are never rewritten, so readers get memoryviews straight into the
+    mapped files instead of copies.
+    """
+
+    def __init__(self, directory, max_segment_size):
+        self.directory = directory
+        self.max_segment_size = max_segment_size
+        self.maps = {}
+        os.makedirs(directory, exist_ok=True)
+        segments = sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith('.seg'))
+        self.segment = segments[-1] if segments else 0
+        self.file = open(self.segment_path(self.segment), 'ab')
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f"{segment:08d}.seg")
+
+    def append(self, data):
+        """Appends one block and returns its (segment, offset, length) once it is on disk."""
+        offset = self.file.tell()
+        if offset > 0 and offset + RECORD_HEADER.size + len(data) > self.max_segment_size:
+            self.file.close()
+            self.segment += 1
+            self.file = open(self.segment_path(self.segment), 'ab')
+            offset = 0
+        self.file.write(RECORD_HEADER.pack(len(data)))
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.segment, offset + RECORD_HEADER.size, len(data)
+
+    def map_segment(self, segment, end):
+        segment_map = self.maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            # The active segment grows, so it is remapped once reads pass the mapped end.
+            # Views into the old map keep it alive until they are released.
+            with open(self.segment_path(segment), 'rb') as segment_file:
+                segment_map = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[segment] = segment_map
+        return segment_map
+
+    def read(self, segment, offset, length):
+        segment_map = self.map_segment(segment, offset + length)
+        return memoryview(segment_map)[offset:offset + length]
+
+    def scan(self, segment):
+        """Yields (offset, memoryview) for every complete record in a segment, for reindexing."""
+        size = os.path.getsize(self.segment_path(segment))
+        if size == 0:
+            return
+        segment_map = self.map_segment(segment, size)
+        view = memoryview(segment_map)
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(view):
+            length = RECORD_HEADER.unpack_from(view, offset)[0]
+            start = offset + RECORD_HEADER.size
+            if start + length > len(view):
+                break
+            yield start, view[start:start + length]
+            offset = start + length
+
+    def segments(self):
+        return range(self.segment + 1)
+
+    def close(self):
+        self.file.close()
+        self.maps.clear()
+
+def encode_location(segment, offset, length):
+    return LOCATION.pack(segment, offset, length)
+
+def decode_location(data):
+    return LOCATION.unpack(data)
@@ -0,0 +1,93 @@
+import ecdsa
+from ecdsa import ellipticcurve
+from parameters import CRYPTO_BACKEND
+
+# Signatures are ECDSA over SECP256k1 with SHA-1 message digests, the ecdsa package
+# default that wallets and tinymask sign with, encoded as raw 32-byte r || 32-byte s.
+# Public keys are the raw 64-byte x || y point. Both backends reject every other key
+# encoding, since nodes on different backends must accept exactly the same transactions.
+SIGNATURE_SIZE = 64
+PUBLIC_KEY_SIZE = 64
+
+class EcdsaBackend:
+    """Pure-Python backend on the ecdsa package."""
+
+    name = 'ecdsa'
+    precomputes = True
+
+    def load_public_key(self, public_key):
+        return ecdsa.VerifyingKey.from_string(public_key, curve=ecdsa.SECP256k1, valid_encodings=('raw',))
+
+    def precompute(self, key):
+        # VerifyingKey.precompute needs the point's order, which keys parsed from strings do not carry
+        point = key.pubkey.point
+        key.pubkey.point = ellipticcurve.PointJacobi(point.curve(), point.x(), point.y(), 1, ecdsa.SECP256k1.order, generator=True)
+        key.pubkey.point * 2
+
+    def verify(self, key, signature, message):
+        try:
+            return key.verify(signature, message)
+        except ecdsa.BadSignatureError:
+            return False
+
+    def sign(self, signing_key, message):
+        return signing_key.sign(message)
+
+class CryptographyBackend:
+    """Native backend on the cryptography package's OpenSSL EC implementation."""
+
+    name = 'cryptography'
+    precomputes = False
+
+    def __init__(self):
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec, utils
+        self.invalid_signature = InvalidSignature
+        self.ec = ec
+        self.utils = utils
+        self.curve = ec.SECP256K1()
+        self.algorithm = ec.ECDSA(hashes.SHA1())
+        self.private_keys = {}
+
+    def load_public_key(self, public_key):
+        if len(public_key) != PUBLIC_KEY_SIZE:
+            raise ValueError("Invalid public key length")
+        return self.ec.EllipticCurvePublicKey.from_encoded_point(self.curve, b'\x04' + public_key)
+
+    def precompute(self, key):
+        pass
+
+    def verify(self, key, signature, message):
+        if len(signature) != SIGNATURE_SIZE:
+            raise ValueError("Invalid signature length")
+        r = int.from_bytes(signature[:32], 'big')
+        s = int.from_bytes(signature[32:], 'big')
+        try:
+            key.verify(self.utils.encode_dss_signature(r, s), message, self.algorithm)
+            return True
+        except self.invalid_signature:
+            return False
+
+    def sign(self, signing_key, message):
+        # Wallets hold pickled ecdsa signing keys, so the private scalar is taken from them
+        secret = signing_key.privkey.secret_multiplier
+        private_key = self.private_keys.get(secret)
+        if private_key is None:
+            private_key = self.private_keys[secret] = self.ec.derive_private_key(secret, self.curve)
+        r, s = self.utils.decode_dss_signature(private_key.sign(message, self.algorithm))
+        return r.to_bytes(32, 'big') + s.to_bytes(32, 'big')
+
+def load_backend(name):
+    if name == 'ecdsa':
+        return EcdsaBackend()
+    if name == 'cryptography':
+        return CryptographyBackend()
+    if name == 'auto':
+        try:
+            return CryptographyBackend()
+        except ImportError:
+            return EcdsaBackend()
+    raise ValueError(f"Unknown crypto backend: {name}")
+
+backend = load_backend(CRYPTO_BACKEND)
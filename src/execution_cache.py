@@ -0,0 +1,34 @@
+from collections import OrderedDict
+
+class ExecutionCache:
+    """Bounded LRU of block execution results.
+
+    Keys are (parent state_root, proposer, transactions), where transactions are
+    (transaction_hash, memo) pairs in block order; the hash does not cover the memo.
+    A result is only ever read, never mutated, so one entry can be handed out many times.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(parent_root, proposer, transactions):
+        return parent_root, proposer, tuple((transaction.transaction_hash, transaction.memo) for transaction in transactions)
+
+    def get(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
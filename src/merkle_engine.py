@@ -0,0 +1,47 @@
+from blake3 import blake3
+
+# The block transaction tree: the first level pairs the utf-8 bytes of the hex
+# transaction hashes, every level pairs an odd last node with itself, and the
+# merkle root is the blake3 hex digest of the top node. Levels above the leaves
+# are contiguous buffers of 32-byte digests.
+HASH_SIZE = 32
+EMPTY_ROOT = blake3(b'').hexdigest()
+
+def hash_leaf_pairs(transaction_hashes, count):
+    last = count - 1
+    return b''.join([blake3((transaction_hashes[left] + transaction_hashes[left + 1 if left < last else left]).encode()).digest() for left in range(0, count, 2)])
+
+def hash_node_pairs(nodes, count):
+    full_end = count // 2 * 2 * HASH_SIZE
+    digests = [blake3(nodes[offset:offset + 2 * HASH_SIZE]).digest() for offset in range(0, full_end, 2 * HASH_SIZE)]
+    if count % 2:
+        digests.append(blake3(nodes[full_end:full_end + HASH_SIZE] * 2).digest())
+    return b''.join(digests)
+
+def transaction_tree_levels(transaction_hashes):
+    """Returns every level of the tree: the transaction hashes, then digest buffers up to the top node."""
+    count = len(transaction_hashes)
+    levels = [transaction_hashes]
+    if count > 1:
+        levels.append(hash_leaf_pairs(transaction_hashes, count))
+        count = (count + 1) // 2
+    while count > 1:
+        levels.append(hash_node_pairs(levels[-1], count))
+        count = (count + 1) // 2
+    return levels
+
+def level_size(levels, level):
+    return len(levels[0]) if level == 0 else len(levels[level]) // HASH_SIZE
+
+def level_node(levels, level, index):
+    if level == 0:
+        return levels[0][index].encode()
+    return levels[level][index * HASH_SIZE:(index + 1) * HASH_SIZE]
+
+def top_node(levels):
+    return level_node(levels, len(levels) - 1, 0)
+
+def transaction_merkle_root(transaction_hashes):
+    if len(transaction_hashes) == 0:
+        return EMPTY_ROOT
+    return blake3(top_node(transaction_tree_levels(transaction_hashes))).hexdigest()
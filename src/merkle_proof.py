@@ -0,0 +1,70 @@
+import blake3
+from merkle_engine import level_node, level_size
+
+# Proofs over the block transaction tree from merkle_engine.transaction_tree_levels
+
+def node_hex(level, node):
+    # Leaves are hex strings already; interior nodes are raw digests
+    return node.decode() if level == 0 else node.hex()
+
+def node_bytes(level, value):
+    return value.encode() if level == 0 else bytes.fromhex(value)
+
+def merkle_root(top_node):
+    return blake3.blake3(top_node).hexdigest()
+
+def transaction_proof(levels, index):
+    """Returns the sibling path of one leaf as [{'position', 'hash'}], bottom up."""
+    proof = []
+    for level in range(len(levels) - 1):
+        sibling_index = index ^ 1 if index ^ 1 < level_size(levels, level) else index
+        proof.append({'position': 'left' if sibling_index < index else 'right', 'hash': node_hex(level, level_node(levels, level, sibling_index))})
+        index >>= 1
+    return proof
+
+def verify_transaction_proof(transaction_hash, proof, expected_root):
+    node = transaction_hash.encode()
+    for level, step in enumerate(proof):
+        sibling = node_bytes(level, step['hash'])
+        node = blake3.blake3(sibling + node if step['position'] == 'left' else node + sibling).digest()
+    return merkle_root(node) == expected_root
+
+def transaction_multiproof(levels, indexes):
+    """Returns the sibling nodes needed to prove every leaf in indexes as [level, index, hash].
+
+    Siblings shared by several leaves, or computable from the proven leaves, appear once.
+    """
+    nodes_needed = []
+    known = set(indexes)
+    for level in range(len(levels) - 1):
+        for index in sorted(known):
+            sibling_index = index ^ 1
+            if sibling_index < level_size(levels, level) and sibling_index not in known:
+                nodes_needed.append([level, sibling_index, node_hex(level, level_node(levels, level, sibling_index))])
+        known = {index >> 1 for index in known}
+    return nodes_needed
+
+def verify_transaction_multiproof(leaves, leaf_count, nodes, expected_root):
+    """leaves maps leaf index to transaction hash; nodes is the output of transaction_multiproof."""
+    if not leaves or leaf_count <= 0 or any(not 0 <= index < leaf_count for index in leaves):
+        return False
+    supplied = {(level, index): node_bytes(level, value) for level, index, value in nodes}
+    known = {index: transaction_hash.encode() for index, transaction_hash in leaves.items()}
+    level = 0
+    width = leaf_count
+    while width > 1:
+        parents = {}
+        for index in sorted(known):
+            left_index = index & ~1
+            if left_index >> 1 in parents:
+                continue
+            right_index = left_index + 1 if left_index + 1 < width else left_index
+            left = known.get(left_index, supplied.get((level, left_index)))
+            right = known.get(right_index, supplied.get((level, right_index)))
+            if left is None or right is None:
+                return False
+            parents[left_index >> 1] = blake3.blake3(left + right).digest()
+        known = parents
+        level += 1
+        width = (width + 1) // 2
+    return merkle_root(known[0]) == expected_root
@@ -0,0 +1,96 @@
+import json
+import os
+import time
+from serialization import encode_state_value
+from state import StateOverlay
+
+# Bytes hashed per trie leaf besides the value: tag, 32-byte path and 32-byte value hash
+LEAF_PREIMAGE_SIZE = 65
+
+class MeteredOverlay(StateOverlay):
+    """StateOverlay that counts the reads and writes made through it."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.read_count = 0
+        self.write_count = 0
+
+    def get(self, contract_address, key):
+        self.read_count += 1
+        return super().get(contract_address, key)
+
+    def set(self, contract_address, key, value):
+        self.write_count += 1
+        super().set(contract_address, key, value)
+
+class ExecutionTrace:
+    """Timings and operation counts for one block execution, per phase, transaction and contract.
+
+    Times are perf_counter nanoseconds. The VM only creates a trace when metering is
+    enabled, so the disabled path never calls into this class.
+    """
+
+    def __init__(self, proposer):
+        self.proposer = proposer
+        self.phases = {}
+        self.transactions = []
+        self.contracts = {}
+        self.state_entries = 0
+        self.bytes_hashed = 0
+        self.last_mark = time.perf_counter_ns()
+        self.transaction_start = None
+        self.transaction_reads = 0
+        self.transaction_writes = 0
+
+    def mark(self, phase):
+        now = time.perf_counter_ns()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self.last_mark
+        self.last_mark = now
+
+    def start_transaction(self, state):
+        self.transaction_reads = state.read_count
+        self.transaction_writes = state.write_count
+        self.transaction_start = time.perf_counter_ns()
+
+    def stop_transaction(self, state, transaction, contract_address, success):
+        elapsed = time.perf_counter_ns() - self.transaction_start
+        reads = state.read_count - self.transaction_reads
+        writes = state.write_count - self.transaction_writes
+        self.transactions.append({
+            'transaction_hash': transaction.transaction_hash,
+            'contract_address': contract_address,
+            'success': success,
+            'ns': elapsed,
+            'reads': reads,
+            'writes': writes
+        })
+        totals = self.contracts.get(contract_address)
+        if totals is None:
+            totals = self.contracts[contract_address] = {'transactions': 0, 'failed': 0, 'ns': 0, 'reads': 0, 'writes': 0}
+        totals['transactions'] += 1
+        totals['failed'] += not success
+        totals['ns'] += elapsed
+        totals['reads'] += reads
+        totals['writes'] += writes
+
+    def record_state_changes(self, changes):
+        for entries in changes.values():
+            for value in entries.values():
+                self.state_entries += 1
+                if value is not None:
+                    self.bytes_hashed += len(encode_state_value(value)) + LEAF_PREIMAGE_SIZE
+
+    def to_dict(self):
+        return {
+            'proposer': self.proposer,
+            'total_ns': sum(self.phases.values()),
+            'phases': self.phases,
+            'contracts': self.contracts,
+            'state_root': {'changed_entries': self.state_entries, 'leaf_bytes_hashed': self.bytes_hashed},
+            'transactions': self.transactions
+        }
+
+    def export(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
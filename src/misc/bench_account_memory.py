@@ -0,0 +1,40 @@
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from records import Account, StakeEntry
+
+ACCOUNT_COUNT = 1000000
+TINYCOIN = 1000000000000000000
+
+def measure(build):
+    # Counts everything the entries allocate, including the address keys and the mapping holding them
+    tracemalloc.start()
+    entries = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del entries
+    return size
+
+def accounts(factory):
+    return {f"{index:0128x}": factory(index * TINYCOIN + 12345, index % 1000) for index in range(ACCOUNT_COUNT)}
+
+def stake_entries(factory):
+    return {f"{index:0128x}": factory(index * TINYCOIN, "active", index) for index in range(ACCOUNT_COUNT)}
+
+def main():
+    rows = (
+        ('account dict', lambda: accounts(lambda balance, nonce: {"balance": balance, "nonce": nonce})),
+        ('Account', lambda: accounts(Account)),
+        ('stake dict', lambda: stake_entries(lambda balance, status, index: {"balance": balance, "status": status, "index": index})),
+        ('StakeEntry', lambda: stake_entries(StakeEntry)),
+    )
+    print(f"{ACCOUNT_COUNT} entries keyed by 128-character addresses")
+    for label, build in rows:
+        size = measure(build)
+        print(f"{label:<13} {size / 2 ** 20:8.1f} MiB per million  {size / ACCOUNT_COUNT:6.0f} B per entry")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ecdsa
+import crypto_backend
+
+VERIFICATIONS = 300
+
+def main():
+    backends = [crypto_backend.EcdsaBackend()]
+    try:
+        backends.append(crypto_backend.CryptographyBackend())
+    except ImportError:
+        print("cryptography is not installed")
+    signing_key = ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1)
+    public_key = signing_key.get_verifying_key().to_string()
+    messages = [f"sender-receiver-{index}--10-{index}".encode() for index in range(VERIFICATIONS)]
+    signatures = [signing_key.sign(message) for message in messages]
+    print(f"selected backend: {crypto_backend.backend.name}")
+    for backend in backends:
+        key = backend.load_public_key(public_key)
+        start = time.perf_counter()
+        assert all(backend.verify(key, signature, message) for signature, message in zip(signatures, messages))
+        verify_rate = VERIFICATIONS / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for message in messages:
+            backend.sign(signing_key, message)
+        sign_rate = VERIFICATIONS / (time.perf_counter() - start)
+        print(f"{backend.name:<13} verify {verify_rate:8.0f}/s  sign {sign_rate:8.0f}/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from blake3 import blake3
+import merkle_engine
+
+LEAF_COUNTS = (1000, 10000, 100000)
+ROUNDS = 3
+
+def list_merkle_root(transaction_hashes):
+    # The per-level list implementation the engine replaced, kept here as the reference
+    if len(transaction_hashes) == 0:
+        return blake3(b'').hexdigest()
+    while len(transaction_hashes) > 1:
+        if len(transaction_hashes) % 2 != 0:
+            transaction_hashes.append(transaction_hashes[-1])
+        if isinstance(transaction_hashes[0], bytes):
+            transaction_hashes = [blake3(transaction_hashes[i] + transaction_hashes[i + 1]).digest() for i in range(0, len(transaction_hashes), 2)]
+        else:
+            transaction_hashes = [blake3(transaction_hashes[i].encode() + transaction_hashes[i + 1].encode()).digest() for i in range(0, len(transaction_hashes), 2)]
+    if isinstance(transaction_hashes[0], str):
+        transaction_hashes[0] = transaction_hashes[0].encode('utf-8')
+    return blake3(transaction_hashes[0]).hexdigest()
+
+def best_time(function, transaction_hashes):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        function(list(transaction_hashes))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    for leaf_count in LEAF_COUNTS:
+        transaction_hashes = [os.urandom(32).hex() for _ in range(leaf_count)]
+        assert merkle_engine.transaction_merkle_root(transaction_hashes) == list_merkle_root(list(transaction_hashes))
+        for label, function in (('lists', list_merkle_root), ('engine', merkle_engine.transaction_merkle_root)):
+            elapsed = best_time(function, transaction_hashes)
+            print(f"{leaf_count:>7} leaves {label:<7} {elapsed * 1e3:8.2f} ms  {leaf_count / elapsed / 1e6:6.2f} M leaves/s")
+
+if __name__ == '__main__':
+    main()
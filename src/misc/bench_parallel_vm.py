@@ -0,0 +1,61 @@
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import vm
+from records import Account
+from transaction import Transaction
+
+TRANSACTION_COUNT = 10000
+ACCOUNT_COUNT = 4000
+CLUSTER_SIZE = 8
+STAKER_COUNT = 50
+ROUNDS = 3
+
+def synthetic_block():
+    # Transfers stay inside clusters of accounts, so each cluster is one conflict-free
+    # group, plus a run of staking transactions that all conflict with each other
+    accounts = {f"{index:064x}": Account(1000 * vm.tinycoin, 0) for index in range(ACCOUNT_COUNT)}
+    addresses = list(accounts)
+    parent = {"6163636f756e7473": accounts}
+    nonces = dict.fromkeys(addresses, 0)
+    transactions = []
+    for index in range(TRANSACTION_COUNT):
+        cluster = (index * 7919) % (ACCOUNT_COUNT // CLUSTER_SIZE) * CLUSTER_SIZE
+        sender = addresses[cluster + index % CLUSTER_SIZE]
+        if index % (TRANSACTION_COUNT // STAKER_COUNT) == 0:
+            receiver, memo = "7374616b696e67", "stake"
+        else:
+            receiver, memo = addresses[cluster + (index + 1) % CLUSTER_SIZE], ''
+        transactions.append(Transaction(sender, receiver, (1 + index % 5) * vm.tinycoin, 0, nonces[sender], '', memo))
+        nonces[sender] += 1
+    return parent, transactions
+
+def run(parent, transactions, mode):
+    vm.VM_EXECUTION_MODE = mode
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        state_root, _ = vm.TinyVMEngine(parent).exec(transactions, "proposer")
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return state_root, best
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    parent, transactions = synthetic_block()
+    groups = vm.TinyVMEngine(parent).conflict_groups(transactions)
+    print(f"{len(transactions)} transactions, {len(groups)} conflict-free groups, largest {max(map(len, groups))}")
+    print(f"workers {vm.VM_PARALLEL_WORKERS}, {os.cpu_count()} cpus")
+    # Start the worker processes before timing
+    vm.get_executor().submit(len, []).result()
+    results = {mode: run(parent, transactions, mode) for mode in ('sequential', 'parallel')}
+    assert results['sequential'][0] == results['parallel'][0], "parallel execution diverged from sequential"
+    for mode, (state_root, elapsed) in results.items():
+        print(f"{mode:<11} {elapsed * 1e3:9.2f} ms  {len(transactions) / elapsed:9.0f} tx/s  root {state_root[:16]}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import serialization
+from records import Account, StakeEntry, to_plain
+
+TINYCOIN = 1000000000000000000
+ROUNDS = 2000
+
+def random_hex(length):
+    return os.urandom(length).hex()
+
+def make_transaction():
+    return {
+        'transaction_hash': random_hex(32),
+        'sender': random_hex(64),
+        'receiver': random_hex(64),
+        'amount': random.randint(1, 10000) * TINYCOIN,
+        'fee': 10,
+        'nonce': random.randint(0, 1000),
+        'signature': random_hex(64),
+        'memo': '',
+        'confirmed': random.randint(0, 100000)
+    }
+
+def make_signature(index):
+    return {'validator_address': random_hex(64), 'timestamp': int(time.time()), 'signature_data': random_hex(64), 'validator_index': index}
+
+def make_block(transaction_count):
+    transactions = [make_transaction() for _ in range(transaction_count)]
+    return {
+        'block_hash': random_hex(32),
+        'height': random.randint(0, 100000),
+        'timestamp': int(time.time()),
+        'merkle_root': random_hex(32),
+        'state_root': random_hex(32),
+        'previous_block_hash': random_hex(32),
+        'proposer': random_hex(64),
+        'chain_id': 'tinychain',
+        'signatures': [make_signature(i) for i in range(6)],
+        'transactions': transactions
+    }
+
+def make_header(block):
+    header = {key: value for key, value in block.items() if key != 'transactions'}
+    header['transaction_hashes'] = [t['transaction_hash'] for t in block['transactions']]
+    return header
+
+def bench(name, record, encode, decode):
+    json_data = json.dumps(to_plain(record)).encode()
+    binary_data = encode(record)
+    assert decode(binary_data) == record
+
+    timings = {}
+    for label, encoder, decoder, data in (('json', lambda r: json.dumps(to_plain(r)).encode(), lambda d: json.loads(d.decode()), json_data), ('binary', encode, decode, binary_data)):
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            encoder(record)
+        encode_time = (time.perf_counter() - start) / ROUNDS
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            decoder(data)
+        decode_time = (time.perf_counter() - start) / ROUNDS
+        timings[label] = (encode_time, decode_time, len(data))
+
+    for label, (encode_time, decode_time, size) in timings.items():
+        print(f"{name:<14} {label:<7} encode {encode_time * 1e6:9.1f} us  decode {decode_time * 1e6:9.1f} us  size {size:7d} B")
+    print(f"{name:<14} size ratio {timings['binary'][2] / timings['json'][2]:.2f}")
+
+def main():
+    random.seed(1)
+    block = make_block(15)
+    bench('transaction', make_transaction(), serialization.encode_transaction, serialization.decode_transaction)
+    bench('block_header', make_header(block), serialization.encode_block_header, serialization.decode_block_header)
+    bench('block', block, serialization.encode_block, serialization.decode_block)
+    bench('account', Account(12345 * TINYCOIN, 42), serialization.encode_state_value, serialization.decode_state_value)
+    bench('stake_entry', StakeEntry(1000 * TINYCOIN, 'active', 3), serialization.encode_state_value, serialization.decode_state_value)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ecdsa
+import signature_verifier
+
+BATCH_SIZES = (16, 128, 512)
+
+def make_items(count):
+    items = []
+    for index in range(count):
+        signing_key = ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1)
+        message = f"sender-receiver-{index}--10-{index}"
+        items.append((signing_key.get_verifying_key().to_string().hex(), signing_key.sign(message.encode()).hex(), message))
+    return items
+
+def main():
+    print(f"{signature_verifier.worker_count()} workers, {os.cpu_count()} cpus")
+    items = make_items(max(BATCH_SIZES))
+    # Start the worker processes before timing
+    signature_verifier.verify_batch(items[:signature_verifier.SIGNATURE_PARALLEL_THRESHOLD])
+    for batch_size in BATCH_SIZES:
+        batch = items[:batch_size]
+        start = time.perf_counter()
+        serial = signature_verifier.verify_chunk(batch)
+        serial_time = time.perf_counter() - start
+        start = time.perf_counter()
+        batched = signature_verifier.verify_batch(batch)
+        batch_time = time.perf_counter() - start
+        assert serial == batched and all(batched)
+        print(f"{batch_size:>5} signatures  serial {batch_size / serial_time:8.0f}/s  batch {batch_size / batch_time:8.0f}/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ecdsa
+import signature_verifier
+
+KEY_COUNT = 6
+VERIFICATIONS = 300
+
+def make_items():
+    # A validator-sized set of keys signing many messages, like header signatures and hot senders
+    signing_keys = [ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1) for _ in range(KEY_COUNT)]
+    items = []
+    for index in range(VERIFICATIONS):
+        signing_key = signing_keys[index % KEY_COUNT]
+        message = f"block-{index}"
+        items.append((signing_key.get_verifying_key().to_string().hex(), signing_key.sign(message.encode()).hex(), message))
+    return items
+
+def cold_verify(public_key_hex, signature, message):
+    backend = signature_verifier.backend
+    return backend.verify(backend.load_public_key(bytes.fromhex(public_key_hex)), bytes.fromhex(signature), message.encode())
+
+def rate(function, items):
+    start = time.perf_counter()
+    assert all(function(*item) for item in items)
+    return len(items) / (time.perf_counter() - start)
+
+def main():
+    items = make_items()
+    cold = rate(cold_verify, items)
+    # The first pass parses and precomputes every key, the second runs fully warm
+    first = rate(signature_verifier.verify_signature, items)
+    warm = rate(signature_verifier.verify_signature, items)
+    print(f"{VERIFICATIONS} verifications over {KEY_COUNT} keys, {signature_verifier.backend.name} backend")
+    print(f"cold (parse every time)  {cold:8.0f}/s")
+    print(f"cache, first pass        {first:8.0f}/s")
+    print(f"cache, warm              {warm:8.0f}/s  ({warm / cold:.2f}x)")
+    print(signature_verifier.verifying_keys.stats())
+
+if __name__ == '__main__':
+    main()
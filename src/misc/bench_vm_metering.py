@@ -0,0 +1,40 @@
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import vm
+from bench_parallel_vm import synthetic_block
+
+ROUNDS = 5
+
+def best_time(parent, transactions):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        engine = vm.TinyVMEngine(parent)
+        engine.exec(transactions, "proposer")
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, engine.trace
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    parent, transactions = synthetic_block()
+    vm.VM_EXECUTION_MODE = 'sequential'
+    vm.VM_METERING = False
+    disabled, _ = best_time(parent, transactions)
+    vm.VM_METERING = True
+    enabled, trace = best_time(parent, transactions)
+    print(f"{len(transactions)} transactions")
+    print(f"metering off {disabled * 1e3:9.2f} ms")
+    print(f"metering on  {enabled * 1e3:9.2f} ms  (+{(enabled / disabled - 1) * 100:.1f}%)")
+    for phase, ns in trace.phases.items():
+        print(f"  {phase:<13} {ns / 1e6:9.2f} ms")
+    for contract_address, totals in trace.contracts.items():
+        print(f"  {contract_address:<17} {totals['transactions']:6d} tx  {totals['ns'] / 1e6:8.2f} ms  {totals['reads']:7d} reads  {totals['writes']:7d} writes")
+
+if __name__ == '__main__':
+    main()
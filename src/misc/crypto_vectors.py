@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ecdsa
+import crypto_backend
+
+# Fixed keys and tinymask-format messages, signed deterministically (RFC 6979) so the
+# vectors are the same on every run
+SECRETS = (1, 2, 0xfc4db4bf067131cccef6b85aee945786b3587d4f07a8ce8df54926440bc6b393, ecdsa.SECP256k1.order - 1)
+MEMOS = ('', 'stake', 'unstake', 'x' * 256)
+ORDER = ecdsa.SECP256k1.order
+
+def message_for(sender, receiver, memo, index):
+    return f"{sender}-{receiver}-{1000 + index}-{memo}-10-{index}".encode()
+
+def build_vectors():
+    """Returns (description, public_key, signature, message, expected) tuples."""
+    signing_keys = [ecdsa.SigningKey.from_secret_exponent(secret, curve=ecdsa.SECP256k1) for secret in SECRETS]
+    addresses = [signing_key.get_verifying_key().to_string().hex() for signing_key in signing_keys]
+    vectors = []
+    for index, signing_key in enumerate(signing_keys):
+        public_key = signing_key.get_verifying_key().to_string()
+        for memo in MEMOS:
+            message = message_for(addresses[index], addresses[(index + 1) % len(addresses)], memo, index)
+            signature = signing_key.sign_deterministic(message)
+            r, s = int.from_bytes(signature[:32], 'big'), int.from_bytes(signature[32:], 'big')
+            label = f"key {index} memo {memo[:8]!r}"
+            vectors.append((f"{label} valid", public_key, signature, message, True))
+            # ECDSA accepts both s and n - s, and neither backend normalizes
+            vectors.append((f"{label} high s", public_key, r.to_bytes(32, 'big') + (ORDER - s).to_bytes(32, 'big'), message, True))
+            vectors.append((f"{label} other message", public_key, signature, message + b'0', False))
+            vectors.append((f"{label} other key", signing_keys[(index + 1) % len(signing_keys)].get_verifying_key().to_string(), signature, message, False))
+            vectors.append((f"{label} flipped bit", public_key, signature[:-1] + bytes((signature[-1] ^ 1,)), message, False))
+            vectors.append((f"{label} zero r", public_key, bytes(32) + signature[32:], message, False))
+            vectors.append((f"{label} s = n", public_key, signature[:32] + ORDER.to_bytes(32, 'big'), message, False))
+            vectors.append((f"{label} truncated", public_key, signature[:63], message, False))
+            vectors.append((f"{label} key off the curve", public_key[:-1] + bytes((public_key[-1] ^ 1,)), signature, message, False))
+            # Only the raw encoding is an address; the same point in any other encoding is rejected
+            for encoding in ('compressed', 'uncompressed', 'hybrid'):
+                vectors.append((f"{label} {encoding} key", signing_key.get_verifying_key().to_string(encoding), signature, message, False))
+    return signing_keys, vectors
+
+def verify(backend, public_key, signature, message):
+    # The node treats a malformed key or signature as a failed verification
+    try:
+        return backend.verify(backend.load_public_key(public_key), signature, message)
+    except Exception:
+        return False
+
+def main():
+    backends = [crypto_backend.EcdsaBackend()]
+    try:
+        backends.append(crypto_backend.CryptographyBackend())
+    except ImportError:
+        print("cryptography is not installed, checking the ecdsa backend alone")
+    signing_keys, vectors = build_vectors()
+    failures = 0
+    for description, public_key, signature, message, expected in vectors:
+        results = [verify(backend, public_key, signature, message) for backend in backends]
+        if any(result != expected for result in results):
+            failures += 1
+            print(f"MISMATCH {description}: expected {expected}, got {dict(zip((backend.name for backend in backends), results))}")
+    # Each backend's own signatures must verify under every backend
+    for signer in backends:
+        for signing_key in signing_keys:
+            message = message_for(signing_key.get_verifying_key().to_string().hex(), 'receiver', '', 0)
+            signature = signer.sign(signing_key, message)
+            for verifier in backends:
+                if not verify(verifier, signing_key.get_verifying_key().to_string(), signature, message):
+                    failures += 1
+                    print(f"MISMATCH signed by {signer.name}, rejected by {verifier.name}")
+    print(f"{len(vectors)} vectors and {len(backends) ** 2 * len(signing_keys)} cross signatures over {', '.join(backend.name for backend in backends)}: {failures} mismatches")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,13 @@
+import os
+import sys
 import plyvel
 import json
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import serialization
+
 class DatabaseViewer:
     def __init__(self, db_path):
         try:
@@ -11,14 +17,14 @@ class DatabaseViewer:
             raise
 
     def format_entry(self, key, value):
-        return f"Key: {key.decode()}\nValue: {self.beautify_json(value.decode())}\n{'-'*40}"
+        return f"Key: {key.decode(errors='backslashreplace')}\nValue: {self.beautify_json(value)}\n{'-'*40}"
 
     def beautify_json(self, value):
         try:
-            parsed = json.loads(value)
+            parsed = serialization.decode(value)
             return json.dumps(parsed, indent=4, sort_keys=True)
-        except json.JSONDecodeError:
-            return value
+        except (ValueError, IndexError):
+            return value.decode(errors='backslashreplace')
 
     def view_all(self):
         try:
@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # List of directories to be removed
-directories=("transactions.db" "headers.db" "blocks.db" "states.db")
+directories=("chain.db" "blocks" "transactions.db" "headers.db" "blocks.db" "states.db")
 
 # Iterate through the list and remove each directory and its contents
 for dir in "${directories[@]}"; do
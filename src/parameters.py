@@ -9,3 +9,38 @@ PEER_DISCOVERY_FILE = 'peers.txt'
 PEER_DISCOVERY_API = 'http://example.com/api/peers'
 MIN_VALIDATORS = 4
 MAX_VALIDATORS = 6
+STATE_CACHE_MAX_ROOTS = 8
+STATE_CACHE_MAX_ENTRIES = 100000
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+STATE_PRUNING_MODE = 'archive'  # Options: 'archive', 'pruned'
+STATE_RETAIN_ROOTS = 128
+STATE_CHECKPOINT_INTERVAL = 1000
+STATE_PRUNE_INTERVAL = 30
+STATE_PRUNE_BATCH_SIZE = 500
+SNAPSHOT_SOURCE = None  # Path or URL of a state snapshot to bootstrap an empty node from
+SNAPSHOT_TRUSTED_BLOCK_HASH = None  # Block hash of the snapshot tip to accept; required to import a snapshot
+SNAPSHOT_RECENT_HEADERS = 128
+SNAPSHOT_CHUNK_ENTRIES = 1000
+BLOCK_STORE_BACKEND = 'leveldb'  # Options: 'leveldb', 'segments'
+BLOCK_SEGMENT_DIRECTORY = 'blocks'
+BLOCK_SEGMENT_SIZE = 256 * 1024 * 1024
+PROOF_MAX_BATCH_SIZE = 256
+VM_EXECUTION_MODE = 'sequential'  # Options: 'sequential', 'parallel'
+VM_PARALLEL_WORKERS = 4
+VM_PARALLEL_MIN_TRANSACTIONS = 1000  # Smaller blocks cost less to run in process than to ship to workers
+EXECUTION_CACHE_MAX_ENTRIES = 16
+VM_METERING = False  # Collect per-transaction timings and state operation counts for every executed block
+VM_TRACE_DIRECTORY = None  # Directory to write each metered block's execution trace to as JSON
+SIGNATURE_WORKERS = None  # None sizes the verification pool to the machine's cores
+SIGNATURE_PARALLEL_THRESHOLD = 16  # Smaller batches are verified on the calling thread
+SIGNATURE_CACHE_MAX_ENTRIES = 10000
+SIGNATURE_CACHE_MAX_AGE = 600  # Seconds a verified signature is trusted without checking it again
+VERIFYING_KEY_CACHE_SIZE = 4096
+VERIFYING_KEY_PRECOMPUTE_AFTER = 3  # Uses before a key gets precomputed tables, which cost about 10 ms to build
+VERIFYING_KEY_MAX_PRECOMPUTED = 64
+CRYPTO_BACKEND = 'auto'  # Options: 'auto', 'cryptography', 'ecdsa'; 'auto' uses cryptography when it is installed
+ADMISSION_WORKERS = 2  # Transaction batches validated concurrently off the event loop
+ADMISSION_QUEUE_SIZE = 1000  # Submissions waiting for validation; /send_transaction answers 503 when full
+ADMISSION_BATCH_SIZE = 64
+STATE_RETAIN_CHECKPOINTS = 2  # Older checkpoints are deleted with their entries, bounding state disk use
@@ -0,0 +1,51 @@
+# Slotted in-memory forms of the two state entry layouts. Stored entries and API
+# responses keep the dict form; to_record and to_plain convert at that boundary.
+# Records are shared between a state and the states derived from it, so they are
+# replaced, never mutated, once written to a state.
+
+class Account:
+    __slots__ = ('balance', 'nonce')
+
+    def __init__(self, balance=0, nonce=0):
+        self.balance = balance
+        self.nonce = nonce
+
+    def to_dict(self):
+        return {'balance': self.balance, 'nonce': self.nonce}
+
+    def __eq__(self, other):
+        return type(other) is Account and self.balance == other.balance and self.nonce == other.nonce
+
+    def __repr__(self):
+        return f"Account(balance={self.balance}, nonce={self.nonce})"
+
+class StakeEntry:
+    __slots__ = ('balance', 'status', 'index')
+
+    def __init__(self, balance, status, index):
+        self.balance = balance
+        self.status = status
+        self.index = index
+
+    def to_dict(self):
+        return {'balance': self.balance, 'status': self.status, 'index': self.index}
+
+    def __eq__(self, other):
+        return type(other) is StakeEntry and self.balance == other.balance and self.status == other.status and self.index == other.index
+
+    def __repr__(self):
+        return f"StakeEntry(balance={self.balance}, status={self.status!r}, index={self.index})"
+
+RECORD_TYPES = (Account, StakeEntry)
+
+def to_record(value):
+    if type(value) is dict:
+        keys = value.keys()
+        if keys == {'balance', 'nonce'}:
+            return Account(value['balance'], value['nonce'])
+        if keys == {'balance', 'status', 'index'}:
+            return StakeEntry(value['balance'], value['status'], value['index'])
+    return value
+
+def to_plain(value):
+    return value.to_dict() if type(value) in RECORD_TYPES else value
@@ -0,0 +1,242 @@
+import json
+import struct
+from records import RECORD_TYPES, to_record
+
+# Records start with the format version byte. Legacy JSON records start with '{'
+# or another JSON token, so they can never be mistaken for a binary record.
+FORMAT_VERSION = 1
+
+TRANSACTION = 1
+BLOCK_HEADER = 2
+SIGNATURE = 3
+BLOCK = 4
+ACCOUNT = 5
+STAKE_ENTRY = 6
+VALUE = 7
+
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_NEGATIVE_INT = 4
+TAG_FLOAT = 5
+TAG_STR = 6
+TAG_HEX = 7
+TAG_LIST = 8
+TAG_DICT = 9
+
+# Field order per record type. A record type in place of None marks a list of nested records.
+RECORD_FIELDS = {
+    TRANSACTION: (('transaction_hash', None), ('sender', None), ('receiver', None), ('amount', None), ('fee', None), ('nonce', None), ('signature', None), ('memo', None), ('confirmed', None)),
+    SIGNATURE: (('validator_address', None), ('timestamp', None), ('signature_data', None), ('validator_index', None)),
+    BLOCK_HEADER: (('block_hash', None), ('height', None), ('timestamp', None), ('previous_block_hash', None), ('merkle_root', None), ('state_root', None), ('proposer', None), ('chain_id', None), ('signatures', SIGNATURE), ('transaction_hashes', None)),
+    BLOCK: (('block_hash', None), ('height', None), ('timestamp', None), ('merkle_root', None), ('state_root', None), ('previous_block_hash', None), ('proposer', None), ('chain_id', None), ('signatures', SIGNATURE), ('transactions', TRANSACTION)),
+    ACCOUNT: (('balance', None), ('nonce', None)),
+    STAKE_ENTRY: (('balance', None), ('status', None), ('index', None)),
+}
+
+def write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def write_value(buffer, value):
+    value_type = type(value)
+    if value_type is str:
+        try:
+            # Addresses, hashes and signatures are stored as raw bytes
+            raw = bytes.fromhex(value)
+            if raw.hex() != value:
+                raise ValueError
+            buffer.append(TAG_HEX)
+        except ValueError:
+            raw = value.encode()
+            buffer.append(TAG_STR)
+        length = len(raw)
+        if length < 0x80:
+            buffer.append(length)
+        else:
+            write_varint(buffer, length)
+        buffer += raw
+    elif value_type is int:
+        # Amounts are 10^18-scale, so integers are length-prefixed big-endian rather than fixed width
+        if value >= 0:
+            buffer.append(TAG_INT)
+        else:
+            buffer.append(TAG_NEGATIVE_INT)
+            value = -value
+        raw = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+        buffer.append(len(raw))
+        buffer += raw
+    elif value is None:
+        buffer.append(TAG_NONE)
+    elif value is True:
+        buffer.append(TAG_TRUE)
+    elif value is False:
+        buffer.append(TAG_FALSE)
+    elif value_type is float:
+        buffer.append(TAG_FLOAT)
+        buffer += struct.pack('>d', value)
+    elif isinstance(value, (list, tuple)):
+        buffer.append(TAG_LIST)
+        write_varint(buffer, len(value))
+        for item in value:
+            write_value(buffer, item)
+    elif isinstance(value, dict):
+        buffer.append(TAG_DICT)
+        write_varint(buffer, len(value))
+        for key, item in value.items():
+            write_value(buffer, str(key))
+            write_value(buffer, item)
+    elif value_type in RECORD_TYPES:
+        write_value(buffer, value.to_dict())
+    elif isinstance(value, int):
+        write_value(buffer, int(value))
+    elif isinstance(value, str):
+        write_value(buffer, str(value))
+    else:
+        raise TypeError(f"Unsupported type for serialization: {value_type.__name__}")
+
+def write_record(buffer, record_type, data):
+    for name, nested_type in RECORD_FIELDS[record_type]:
+        value = data.get(name)
+        if nested_type is None:
+            write_value(buffer, value)
+        else:
+            write_varint(buffer, len(value))
+            for item in value:
+                write_record(buffer, nested_type, item)
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def read_varint(self):
+        data = self.data
+        value = 0
+        shift = 0
+        while True:
+            byte = data[self.offset]
+            self.offset += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def read_bytes(self, length):
+        end = self.offset + length
+        if end > len(self.data):
+            raise ValueError("Truncated record")
+        value = self.data[self.offset:end]
+        self.offset = end
+        return value
+
+    def read_value(self):
+        data = self.data
+        tag = data[self.offset]
+        self.offset += 1
+        if tag == TAG_HEX or tag == TAG_STR:
+            length = data[self.offset]
+            if length < 0x80:
+                self.offset += 1
+            else:
+                length = self.read_varint()
+            raw = self.read_bytes(length)
+            return raw.hex() if tag == TAG_HEX else bytes(raw).decode()
+        if tag == TAG_INT or tag == TAG_NEGATIVE_INT:
+            length = data[self.offset]
+            self.offset += 1
+            value = int.from_bytes(self.read_bytes(length), 'big')
+            return value if tag == TAG_INT else -value
+        if tag == TAG_NONE:
+            return None
+        if tag == TAG_TRUE:
+            return True
+        if tag == TAG_FALSE:
+            return False
+        if tag == TAG_FLOAT:
+            return struct.unpack('>d', self.read_bytes(8))[0]
+        if tag == TAG_LIST:
+            return [self.read_value() for _ in range(self.read_varint())]
+        if tag == TAG_DICT:
+            count = self.read_varint()
+            value = {}
+            for _ in range(count):
+                key = self.read_value()
+                value[key] = self.read_value()
+            return value
+        raise ValueError(f"Unknown value tag: {tag}")
+
+    def read_record(self, record_type):
+        data = {}
+        for name, nested_type in RECORD_FIELDS[record_type]:
+            if nested_type is None:
+                data[name] = self.read_value()
+            else:
+                data[name] = [self.read_record(nested_type) for _ in range(self.read_varint())]
+        return data
+
+def encode(record_type, data):
+    buffer = bytearray((FORMAT_VERSION, record_type))
+    if record_type == VALUE:
+        write_value(buffer, data)
+    else:
+        write_record(buffer, record_type, data)
+    return bytes(buffer)
+
+def decode(data, record_type=None):
+    """Decodes a binary record, or a legacy JSON record.
+
+    When record_type is given, a binary record of another type is rejected.
+    """
+    if not data or data[0] != FORMAT_VERSION:
+        return json.loads(bytes(data).decode())
+    if record_type is not None and data[1] != record_type:
+        raise ValueError(f"Expected record type {record_type}, found {data[1]}")
+    reader = Reader(memoryview(data))
+    reader.offset = 2
+    if data[1] == VALUE:
+        return reader.read_value()
+    if data[1] not in RECORD_FIELDS:
+        raise ValueError(f"Unknown record type: {data[1]}")
+    return reader.read_record(data[1])
+
+def encode_transaction(transaction_data):
+    return encode(TRANSACTION, transaction_data)
+
+def decode_transaction(data):
+    return decode(data, TRANSACTION)
+
+def encode_block_header(block_header_data):
+    return encode(BLOCK_HEADER, block_header_data)
+
+def decode_block_header(data):
+    return decode(data, BLOCK_HEADER)
+
+def encode_block(block_data):
+    return encode(BLOCK, block_data)
+
+def decode_block(data):
+    return decode(data, BLOCK)
+
+def encode_value(value):
+    return encode(VALUE, value)
+
+def decode_value(data):
+    return decode(data, VALUE)
+
+def encode_state_value(value):
+    # Accounts and staking entries get fixed layouts; anything else is a tagged value
+    if type(value) in RECORD_TYPES:
+        value = value.to_dict()
+    if isinstance(value, dict):
+        if value.keys() == {'balance', 'nonce'}:
+            return encode(ACCOUNT, value)
+        if value.keys() == {'balance', 'status', 'index'}:
+            return encode(STAKE_ENTRY, value)
+    return encode(VALUE, value)
+
+def decode_state_value(data):
+    return to_record(decode(data))
@@ -0,0 +1,171 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from crypto_backend import backend
+from parameters import SIGNATURE_WORKERS, SIGNATURE_PARALLEL_THRESHOLD
+from parameters import VERIFYING_KEY_CACHE_SIZE, VERIFYING_KEY_PRECOMPUTE_AFTER, VERIFYING_KEY_MAX_PRECOMPUTED
+
+# A verification item is (public_key_hex, signature_hex, message), with the message as a str
+executor = None
+executor_lock = threading.Lock()
+
+def worker_count():
+    return SIGNATURE_WORKERS or os.cpu_count() or 1
+
+def get_executor():
+    global executor
+    # Admission threads can ask for the pool at the same time
+    with executor_lock:
+        if executor is None:
+            # Spawned workers also re-import the main script as __mp_main__, so entry points keep their setup under a __main__ guard
+            executor = ProcessPoolExecutor(max_workers=worker_count(), mp_context=multiprocessing.get_context('spawn'))
+        return executor
+
+def discard_executor(broken_executor):
+    global executor
+    with executor_lock:
+        if executor is broken_executor:
+            executor = None
+    broken_executor.shutdown(wait=False, cancel_futures=True)
+
+class VerifyingKeyCache:
+    """LRU of parsed verifying keys by public key hex.
+
+    With the ecdsa backend, a key used precompute_after times gets precomputed
+    multiplication tables, which roughly halve its verification time. Tables are
+    large, so at most max_precomputed cached keys hold them. Each worker process
+    has its own cache, shared by the threads that verify in it.
+    """
+
+    def __init__(self, max_entries, precompute_after, max_precomputed):
+        self.max_entries = max_entries
+        self.precompute_after = precompute_after
+        self.max_precomputed = max_precomputed
+        # public_key_hex -> [key, uses, precomputed]
+        self.keys = OrderedDict()
+        self.precomputed = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, public_key_hex):
+        with self.lock:
+            return self.get_locked(public_key_hex)
+
+    def get_locked(self, public_key_hex):
+        entry = self.keys.get(public_key_hex)
+        if entry is None:
+            self.misses += 1
+            entry = [backend.load_public_key(bytes.fromhex(public_key_hex)), 0, False]
+            self.keys[public_key_hex] = entry
+            while len(self.keys) > self.max_entries:
+                if self.keys.popitem(last=False)[1][2]:
+                    self.precomputed -= 1
+        else:
+            self.hits += 1
+            self.keys.move_to_end(public_key_hex)
+        entry[1] += 1
+        if backend.precomputes and entry[1] >= self.precompute_after and not entry[2] and self.precomputed < self.max_precomputed:
+            backend.precompute(entry[0])
+            entry[2] = True
+            self.precomputed += 1
+        return entry[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'keys': len(self.keys), 'precomputed': self.precomputed, 'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+verifying_keys = VerifyingKeyCache(VERIFYING_KEY_CACHE_SIZE, VERIFYING_KEY_PRECOMPUTE_AFTER, VERIFYING_KEY_MAX_PRECOMPUTED)
+
+def verify_signature(public_key_hex, signature, message):
+    try:
+        public_key = verifying_keys.get(public_key_hex)
+        return backend.verify(public_key, bytes.fromhex(signature), message.encode())
+    except Exception as e:
+        logging.error(f"Failed to verify signature: {e}")
+        return False
+
+def verify_chunk(items):
+    return [verify_signature(public_key_hex, signature, message) for public_key_hex, signature, message in items]
+
+def verify_batch(items):
+    """Verifies every item and returns one bool per item, in order.
+
+    Batches of at least SIGNATURE_PARALLEL_THRESHOLD items are split into one
+    contiguous chunk per worker process; smaller ones are verified in process,
+    as is a batch the pool fails on.
+    """
+    items = list(items)
+    workers = worker_count()
+    if workers <= 1 or len(items) < SIGNATURE_PARALLEL_THRESHOLD:
+        return verify_chunk(items)
+    step = -(-len(items) // workers)
+    results = []
+    pool = get_executor()
+    try:
+        for chunk_results in pool.map(verify_chunk, [items[start:start + step] for start in range(0, len(items), step)]):
+            results.extend(chunk_results)
+    except Exception as e:
+        # verify_chunk does not raise, so this is the pool itself, e.g. a killed worker breaking it; the next batch gets a new one
+        logging.error(f"Signature worker pool failed, verifying {len(items)} signatures in process: {e}")
+        discard_executor(pool)
+        return verify_chunk(items)
+    return results
+
+class VerifiedSignatureCache:
+    """Bounded record of the items that verified, so a signature is checked once.
+
+    The key is the whole item, message included: a transaction hash does not
+    cover the memo, so (transaction_hash, signature) could vouch for a memo that
+    was never signed. Entries expire max_age seconds after they were verified.
+    """
+
+    def __init__(self, max_entries, max_age):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Admission threads and the event loop share the cache
+        self.lock = threading.Lock()
+
+    def contains(self, item):
+        with self.lock:
+            verified_at = self.entries.get(item)
+            if verified_at is None:
+                return False
+            if time.monotonic() - verified_at > self.max_age:
+                del self.entries[item]
+                return False
+            return True
+
+    def add(self, item):
+        with self.lock:
+            now = time.monotonic()
+            self.entries[item] = now
+            self.entries.move_to_end(item)
+            # Entries are in verification order, so the oldest are at the front
+            while self.entries and (len(self.entries) > self.max_entries or now - next(iter(self.entries.values())) > self.max_age):
+                self.entries.popitem(last=False)
+
+    def discard(self, item):
+        with self.lock:
+            self.entries.pop(item, None)
+
+    def verify_batch(self, items):
+        """Like verify_batch, verifying only the items that are not cached."""
+        items = list(items)
+        results = [self.contains(item) for item in items]
+        pending = [index for index, cached in enumerate(results) if not cached]
+        with self.lock:
+            self.hits += len(items) - len(pending)
+            self.misses += len(pending)
+        for index, valid in zip(pending, verify_batch([items[index] for index in pending])):
+            results[index] = valid
+            if valid:
+                self.add(items[index])
+        return results
@@ -0,0 +1,110 @@
+import struct
+from blake3 import blake3
+
+# A snapshot is the magic bytes followed by frames of (type, varint length, payload):
+# the tip header, recent headers in ascending height, state entry chunks, then a
+# trailer carrying the entry count and a digest over every entry.
+SNAPSHOT_MAGIC = b'TCSNAP\x01'
+
+FRAME_TIP_HEADER = 1
+FRAME_RECENT_HEADER = 2
+FRAME_STATE_ENTRIES = 3
+FRAME_END = 4
+
+def write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def encode_frame(frame_type, payload):
+    buffer = bytearray((frame_type,))
+    write_varint(buffer, len(payload))
+    buffer += payload
+    return bytes(buffer)
+
+def encode_entries(entries):
+    buffer = bytearray()
+    for key, value in entries:
+        write_varint(buffer, len(key))
+        buffer += key
+        write_varint(buffer, len(value))
+        buffer += value
+    return bytes(buffer)
+
+def decode_entries(payload):
+    entries = []
+    offset = 0
+    while offset < len(payload):
+        key_length, offset = read_varint_at(payload, offset)
+        key = payload[offset:offset + key_length]
+        offset += key_length
+        value_length, offset = read_varint_at(payload, offset)
+        value = payload[offset:offset + value_length]
+        offset += value_length
+        if len(value) != value_length:
+            raise ValueError("Truncated snapshot entry")
+        entries.append((key, value))
+    return entries
+
+def encode_trailer(state_root, entry_count, digest):
+    return struct.pack('>Q', entry_count) + digest + state_root.encode()
+
+def decode_trailer(payload):
+    entry_count = struct.unpack('>Q', payload[:8])[0]
+    return payload[40:].decode(), entry_count, payload[8:40]
+
+def read_varint_at(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated snapshot varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def read_exact(stream, length):
+    data = bytearray()
+    while len(data) < length:
+        chunk = stream.read(length - len(data))
+        if not chunk:
+            raise ValueError("Snapshot stream ended early")
+        data += chunk
+    return bytes(data)
+
+def read_frames(stream):
+    """Yields (frame_type, payload) from a file-like stream, one frame in memory at a time."""
+    if read_exact(stream, len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise ValueError("Not a tinychain snapshot")
+    while True:
+        frame_type = read_exact(stream, 1)[0]
+        length = 0
+        shift = 0
+        while True:
+            byte = read_exact(stream, 1)[0]
+            length |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        yield frame_type, read_exact(stream, length)
+        if frame_type == FRAME_END:
+            return
+
+class EntryDigest:
+    def __init__(self):
+        self.hasher = blake3()
+        self.count = 0
+
+    def update(self, entries):
+        for key, value in entries:
+            self.hasher.update(struct.pack('>II', len(key), len(value)))
+            self.hasher.update(key)
+            self.hasher.update(value)
+            self.count += 1
+
+    def digest(self):
+        return self.hasher.digest()
@@ -0,0 +1,187 @@
+import copy
+from collections.abc import MutableMapping
+from records import RECORD_TYPES
+from state_cache import MISSING
+
+class ContractState(MutableMapping):
+    """Lazy view of one contract's entries at a state root.
+
+    Entries are read from storage on first access and copied, so callers can
+    mutate them in place. changes() reports only the entries that differ
+    from what was read. The VM writes through a StateOverlay instead.
+    """
+
+    def __init__(self, reader, state_root, contract_address):
+        self.reader = reader
+        self.state_root = state_root
+        self.contract_address = contract_address
+        self.entries = {}
+        self.originals = {}
+        self.complete = False
+
+    def load(self, key):
+        if key not in self.entries:
+            value = self.reader.fetch_account(self.contract_address, key, self.state_root)
+            self.originals[key] = value
+            self.entries[key] = copy.copy(value) if isinstance(value, (dict,) + RECORD_TYPES) else value
+        return self.entries[key]
+
+    def __getitem__(self, key):
+        value = self.load(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.load(key)
+        self.entries[key] = value
+
+    def __delitem__(self, key):
+        self[key]
+        self.entries[key] = None
+
+    def __iter__(self):
+        if not self.complete:
+            # Stored keys come first in key order, then new keys in creation order
+            entries = {}
+            for key in self.reader.iterate_contract_keys(self.contract_address, self.state_root):
+                entries[key] = self.load(key)
+            for key, value in self.entries.items():
+                entries.setdefault(key, value)
+            self.entries = entries
+            self.complete = True
+        return (key for key, value in list(self.entries.items()) if value is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def changes(self):
+        return {key: value for key, value in self.entries.items() if value != self.originals.get(key)}
+
+class WorldState:
+    def __init__(self, reader, state_root):
+        self.reader = reader
+        self.state_root = state_root
+        self.contracts = {}
+
+    def __getitem__(self, contract_address):
+        if contract_address not in self.contracts:
+            self.contracts[contract_address] = ContractState(self.reader, self.state_root, contract_address)
+        return self.contracts[contract_address]
+
+    def get(self, contract_address, default=None):
+        # Every contract exists in a stored state, so the default is never needed
+        return self[contract_address]
+
+    def items(self):
+        return self.contracts.items()
+
+    def state_trie(self):
+        return self.reader.fetch_state_trie(self.state_root)
+
+    def to_dict(self):
+        return {
+            contract_address: dict(self[contract_address].items())
+            for contract_address in self.reader.iterate_contracts(self.state_root)
+        }
+
+class StateOverlay:
+    """Journaled layer of writes over a parent state.
+
+    The parent is a WorldState, another StateOverlay, or a plain
+    {contract_address: {key: value}} dict. Reads fall through to the parent
+    untouched, so values must be replaced rather than mutated. checkpoint and
+    revert undo writes within a block; commit folds them into a parent overlay.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.writes = {}
+        self.journal = []
+
+    def base_state(self):
+        return self.parent.base_state() if isinstance(self.parent, StateOverlay) else self.parent
+
+    def get(self, contract_address, key):
+        value = self.writes.get((contract_address, key), MISSING)
+        return self.read_parent(contract_address, key) if value is MISSING else value
+
+    def read_parent(self, contract_address, key):
+        if isinstance(self.parent, StateOverlay):
+            return self.parent.get(contract_address, key)
+        if isinstance(self.parent, WorldState):
+            return self.parent.reader.fetch_account(contract_address, key, self.parent.state_root)
+        return self.parent.get(contract_address, {}).get(key)
+
+    def read_base(self, contract_address, key):
+        return self.parent.read_base(contract_address, key) if isinstance(self.parent, StateOverlay) else self.read_parent(contract_address, key)
+
+    def set(self, contract_address, key, value):
+        entry_key = (contract_address, key)
+        self.journal.append((entry_key, self.writes.get(entry_key, MISSING)))
+        self.writes[entry_key] = value
+
+    def delete(self, contract_address, key):
+        self.set(contract_address, key, None)
+
+    def contract_keys(self, contract_address):
+        if isinstance(self.parent, StateOverlay):
+            keys = self.parent.contract_keys(contract_address)
+        elif isinstance(self.parent, WorldState):
+            keys = list(self.parent.reader.iterate_contract_keys(contract_address, self.parent.state_root))
+        else:
+            keys = list(self.parent.get(contract_address, {}))
+        keys += [key for (written_contract, key), value in self.writes.items() if written_contract == contract_address and key not in keys]
+        return [key for key in keys if self.get(contract_address, key) is not None]
+
+    def checkpoint(self):
+        return len(self.journal)
+
+    def revert(self, checkpoint):
+        while len(self.journal) > checkpoint:
+            entry_key, previous = self.journal.pop()
+            if previous is MISSING:
+                del self.writes[entry_key]
+            else:
+                self.writes[entry_key] = previous
+
+    def commit(self):
+        if isinstance(self.parent, StateOverlay):
+            for (contract_address, key), value in self.writes.items():
+                self.parent.set(contract_address, key, value)
+            self.writes = {}
+        self.journal = []
+
+    def discard(self):
+        self.writes = {}
+        self.journal = []
+
+    def written_keys(self):
+        keys = self.parent.written_keys() if isinstance(self.parent, StateOverlay) else set()
+        keys.update(self.writes)
+        return keys
+
+    def changed_keys(self):
+        """Returns the (contract_address, key) entries that differ from the base state."""
+        return {entry_key for entry_key in self.written_keys() if self.get(*entry_key) != self.read_base(*entry_key)}
+
+    def changes(self):
+        changes = {}
+        for contract_address, key in sorted(self.changed_keys()):
+            changes.setdefault(contract_address, {})[key] = self.get(contract_address, key)
+        return changes
+
+def state_changes(state):
+    """Returns {contract_address: {key: value}} for what changed in state.
+
+    A plain dict state is treated as changes on top of an empty state.
+    """
+    if isinstance(state, StateOverlay):
+        return state.changes()
+    return {
+        contract_address: entries.changes() if isinstance(entries, ContractState) else entries
+        for contract_address, entries in state.items()
+    }
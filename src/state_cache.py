@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+
+MISSING = object()
+
+class StateCache:
+    def __init__(self, max_roots, max_entries):
+        self.max_roots = max_roots
+        self.max_entries = max_entries
+        self.roots = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Read views on executor threads share the cache with commits on the event loop
+        self.lock = threading.Lock()
+
+    def get(self, state_root, entry_key):
+        with self.lock:
+            entries = self.roots.get(state_root)
+            if entries is None or entry_key not in entries:
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+            self.roots.move_to_end(state_root)
+            return entries[entry_key]
+
+    def put(self, state_root, entry_key, value):
+        with self.lock:
+            self.put_locked(state_root, entry_key, value)
+
+    def put_locked(self, state_root, entry_key, value):
+        entries = self.roots.get(state_root)
+        if entries is None:
+            entries = self.roots[state_root] = {}
+            while len(self.roots) > self.max_roots:
+                self.roots.popitem(last=False)
+        elif len(entries) >= self.max_entries and entry_key not in entries:
+            del entries[next(iter(entries))]
+        entries[entry_key] = value
+        self.roots.move_to_end(state_root)
+
+    def advance(self, parent_root, state_root, changes):
+        with self.lock:
+            self.advance_locked(parent_root, state_root, changes)
+
+    def advance_locked(self, parent_root, state_root, changes):
+        # The parent's entries carry over to the new root, so the tip stays warm
+        entries = self.roots.pop(parent_root, {}) if parent_root != state_root else self.roots.get(parent_root, {})
+        for contract_address, contract_changes in changes.items():
+            for key, value in contract_changes.items():
+                entries[(contract_address, key)] = value
+        while len(entries) > self.max_entries:
+            del entries[next(iter(entries))]
+        self.roots[state_root] = entries
+        self.roots.move_to_end(state_root)
+        while len(self.roots) > self.max_roots:
+            self.roots.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.roots.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'roots': len(self.roots),
+                'entries': sum(len(entries) for entries in self.roots.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+class RootCache:
+    """LRU of one shared object per state root, such as a state trie or a validator set."""
+
+    def __init__(self, max_roots):
+        self.max_roots = max_roots
+        self.roots = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.roots)
+
+    def __contains__(self, state_root):
+        return state_root in self.roots
+
+    def get(self, state_root):
+        with self.lock:
+            value = self.roots.get(state_root)
+            if value is not None:
+                self.roots.move_to_end(state_root)
+            return value
+
+    def put(self, state_root, value):
+        with self.lock:
+            self.roots[state_root] = value
+            self.roots.move_to_end(state_root)
+            while len(self.roots) > self.max_roots:
+                self.roots.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.roots.clear()
@@ -0,0 +1,205 @@
+from bisect import bisect_left
+from blake3 import blake3
+from serialization import encode_state_value
+
+# A compact sparse Merkle trie over 256-bit paths, one leaf per state entry.
+# A subtree holding a single entry is just that leaf, so the shape depends only on
+# the set of paths and never on the order entries were written in.
+PATH_BITS = 256
+EMPTY_HASH = bytes(32)
+LEAF_TAG = b'\x00'
+BRANCH_TAG = b'\x01'
+
+def entry_path(contract_address, key):
+    return int.from_bytes(blake3(f"{contract_address}:{key}".encode()).digest(), 'big')
+
+def value_hash(value):
+    return blake3(encode_state_value(value)).digest()
+
+class Leaf:
+    __slots__ = ('path', 'value_hash', 'hash')
+
+    def __init__(self, path, value_hash):
+        self.path = path
+        self.value_hash = value_hash
+        self.hash = blake3(LEAF_TAG + path.to_bytes(32, 'big') + value_hash).digest()
+
+class Branch:
+    __slots__ = ('left', 'right', 'hash')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        # Hashed on first use, so a batch of updates only hashes the final nodes
+        self.hash = None
+
+def node_hash(node):
+    if node is None:
+        return EMPTY_HASH
+    if node.hash is None:
+        node.hash = blake3(BRANCH_TAG + node_hash(node.left) + node_hash(node.right)).digest()
+    return node.hash
+
+def bit_at(path, depth):
+    return (path >> (PATH_BITS - 1 - depth)) & 1
+
+def insert(node, depth, leaf):
+    if node is None:
+        return leaf
+    if type(node) is Leaf:
+        return leaf if node.path == leaf.path else split(node, leaf, depth)
+    if bit_at(leaf.path, depth):
+        return Branch(node.left, insert(node.right, depth + 1, leaf))
+    return Branch(insert(node.left, depth + 1, leaf), node.right)
+
+def split(existing, leaf, depth):
+    leaf_bit = bit_at(leaf.path, depth)
+    if bit_at(existing.path, depth) == leaf_bit:
+        child = split(existing, leaf, depth + 1)
+        return Branch(None, child) if leaf_bit else Branch(child, None)
+    return Branch(existing, leaf) if leaf_bit else Branch(leaf, existing)
+
+def remove(node, depth, path):
+    if node is None:
+        return None
+    if type(node) is Leaf:
+        return None if node.path == path else node
+    if bit_at(path, depth):
+        left, right = node.left, remove(node.right, depth + 1, path)
+    else:
+        left, right = remove(node.left, depth + 1, path), node.right
+    if left is node.left and right is node.right:
+        return node
+    # A subtree left with one entry collapses into its leaf
+    if left is None and (right is None or type(right) is Leaf):
+        return right
+    if right is None and type(left) is Leaf:
+        return left
+    return Branch(left, right)
+
+def build(leaves, paths, low, high, depth):
+    if low == high:
+        return None
+    if high - low == 1:
+        return leaves[low]
+    shift = PATH_BITS - 1 - depth
+    # Leaves in [low, high) share the bits above depth, so the first one with this bit set splits them
+    threshold = (paths[low] >> (shift + 1) << (shift + 1)) | (1 << shift)
+    middle = bisect_left(paths, threshold, low, high)
+    return Branch(build(leaves, paths, low, middle, depth + 1), build(leaves, paths, middle, high, depth + 1))
+
+def lift(node, depth):
+    # Extends a subtree rooted below depth up to it through single-child branches; leaves sit at any depth
+    digest, node_depth, path = node
+    if node_depth is None:
+        return digest
+    for level in range(node_depth - 1, depth - 1, -1):
+        digest = blake3(BRANCH_TAG + EMPTY_HASH + digest if bit_at(path, level) else BRANCH_TAG + digest + EMPTY_HASH).digest()
+    return digest
+
+def merge(left, right, depth):
+    return blake3(BRANCH_TAG + lift(left, depth + 1) + lift(right, depth + 1)).digest(), depth, left[2]
+
+def sorted_root_hash(leaves):
+    """Returns the root hash of the trie over (path, value_hash) pairs given in ascending path order.
+
+    Holds one pending subtree per split depth, so memory stays bounded however many leaves stream through.
+    """
+    # Each item is ((hash, depth, path), split depth with the item below it)
+    stack = []
+    previous_path = None
+    for path, leaf_value_hash in leaves:
+        if previous_path is not None and path <= previous_path:
+            raise ValueError("Leaves are not in ascending path order")
+        split_depth = PATH_BITS - (path ^ previous_path).bit_length() if previous_path is not None else None
+        while len(stack) >= 2 and stack[-1][1] > split_depth:
+            (right, right_split), (left, left_split) = stack.pop(), stack.pop()
+            stack.append((merge(left, right, right_split), left_split))
+        stack.append(((Leaf(path, leaf_value_hash).hash, None, path), split_depth))
+        previous_path = path
+    if not stack:
+        return EMPTY_HASH
+    while len(stack) >= 2:
+        (right, right_split), (left, left_split) = stack.pop(), stack.pop()
+        stack.append((merge(left, right, right_split), left_split))
+    return lift(stack[0][0], 0)
+
+class StateTrie:
+    """Persistent authenticated map of state entries.
+
+    Updates copy only the nodes on the touched paths, so a trie and the tries
+    derived from it share everything else and stay valid side by side.
+    """
+
+    __slots__ = ('root',)
+
+    def __init__(self, root=None):
+        self.root = root
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Builds a trie from ((contract_address, key), value) pairs in one pass."""
+        return cls.from_leaves(Leaf(entry_path(contract_address, key), value_hash(value)) for (contract_address, key), value in entries if value is not None)
+
+    @classmethod
+    def from_leaves(cls, leaves):
+        leaves = sorted(leaves, key=lambda leaf: leaf.path)
+        paths = [leaf.path for leaf in leaves]
+        return cls(build(leaves, paths, 0, len(leaves), 0))
+
+    def update(self, changes):
+        """Returns a new trie with {contract_address: {key: value}} applied; a None value removes the entry."""
+        root = self.root
+        for contract_address, entries in changes.items():
+            for key, value in entries.items():
+                path = entry_path(contract_address, key)
+                if value is None:
+                    root = remove(root, 0, path)
+                else:
+                    root = insert(root, 0, Leaf(path, value_hash(value)))
+        return StateTrie(root)
+
+    def root_hash(self):
+        return node_hash(self.root)
+
+    def prove(self, contract_address, key):
+        """Returns (siblings, terminal) for the entry's path.
+
+        siblings are the hashes beside the path from the root down, None where a
+        subtree is empty. terminal is the leaf the path ends at as (path, value_hash),
+        or None if it ends in an empty subtree; a leaf with another path proves absence.
+        """
+        path = entry_path(contract_address, key)
+        siblings = []
+        node = self.root
+        depth = 0
+        while type(node) is Branch:
+            if bit_at(path, depth):
+                sibling, node = node.left, node.right
+            else:
+                sibling, node = node.right, node.left
+            siblings.append(node_hash(sibling) if sibling is not None else None)
+            depth += 1
+        terminal = (node.path, node.value_hash) if node is not None else None
+        return siblings, terminal
+
+def verify_proof(root_hash, contract_address, key, value, siblings, terminal):
+    """Checks a proof from StateTrie.prove that the entry holds value, or is absent when value is None."""
+    path = entry_path(contract_address, key)
+    depth = len(siblings)
+    if value is not None:
+        if terminal != (path, value_hash(value)):
+            return False
+        node = Leaf(path, terminal[1]).hash
+    elif terminal is None:
+        node = EMPTY_HASH
+    else:
+        # The other leaf must sit where the path ends, or it proves nothing about this key
+        other_path, other_value_hash = terminal
+        if other_path == path or other_path >> (PATH_BITS - depth) != path >> (PATH_BITS - depth):
+            return False
+        node = Leaf(other_path, other_value_hash).hash
+    for depth in range(len(siblings) - 1, -1, -1):
+        sibling = siblings[depth] if siblings[depth] is not None else EMPTY_HASH
+        node = blake3(BRANCH_TAG + sibling + node if bit_at(path, depth) else BRANCH_TAG + node + sibling).digest()
+    return node == root_hash
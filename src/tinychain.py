@@ -2,22 +2,63 @@ import asyncio
 import logging
 import plyvel
 import json
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+import os
+import struct
 import blake3
 import time
 from aiohttp import web
 from block import BlockHeader, Block, Signature
-from transaction import Transaction, transaction_schema
+from transaction import Transaction
 from validation_engine import ValidationEngine
 from vm import TinyVMEngine
+from execution_cache import ExecutionCache
 from wallet import Wallet
-from parameters import HTTP_PORT, MAX_TX_POOL, ROUND_TIMEOUT, PEER_DISCOVERY_METHOD, PEER_DISCOVERY_FILE, PEER_DISCOVERY_API
-from peer_communication import broadcast_block_header, broadcast_transaction
+from state import WorldState, StateOverlay, state_changes
+from state_cache import StateCache, RootCache, MISSING
+from state_trie import StateTrie, entry_path, value_hash, sorted_root_hash
+from records import Account, to_record, to_plain
+from validator_set import ValidatorSet, STAKING_CONTRACT_ADDRESS
+from merkle_engine import transaction_tree_levels, transaction_merkle_root
+from merkle_proof import transaction_proof, transaction_multiproof
+import serialization
+import crypto_backend
+from block_store import SegmentBlockStore, encode_location, decode_location
+import requests
+from snapshot import SNAPSHOT_MAGIC, FRAME_TIP_HEADER, FRAME_RECENT_HEADER, FRAME_STATE_ENTRIES, FRAME_END, EntryDigest, encode_frame, encode_entries, decode_entries, encode_trailer, decode_trailer, read_frames
+from parameters import HTTP_PORT, MAX_TX_POOL, ROUND_TIMEOUT, PEER_DISCOVERY_METHOD, PEER_DISCOVERY_FILE, PEER_DISCOVERY_API, STATE_CACHE_MAX_ROOTS, STATE_CACHE_MAX_ENTRIES, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+from parameters import STATE_PRUNING_MODE, STATE_RETAIN_ROOTS, STATE_CHECKPOINT_INTERVAL, STATE_RETAIN_CHECKPOINTS, STATE_PRUNE_INTERVAL, STATE_PRUNE_BATCH_SIZE
+from parameters import SNAPSHOT_SOURCE, SNAPSHOT_TRUSTED_BLOCK_HASH, SNAPSHOT_RECENT_HEADERS, SNAPSHOT_CHUNK_ENTRIES
+from parameters import BLOCK_STORE_BACKEND, BLOCK_SEGMENT_DIRECTORY, BLOCK_SEGMENT_SIZE, PROOF_MAX_BATCH_SIZE, EXECUTION_CACHE_MAX_ENTRIES, VM_TRACE_DIRECTORY
+from parameters import ADMISSION_WORKERS, ADMISSION_QUEUE_SIZE, ADMISSION_BATCH_SIZE
+from peer_communication import broadcast_block_header
+from admission import AdmissionPipeline
 
 TINYCOIN = 1000000000000000000
 TINYCHAIN_UNIT = 'tatoshi'
 
+DATABASE_PATH = 'chain.db'
+HEADERS_NAMESPACE = b'headers:'
+BLOCKS_NAMESPACE = b'blocks:'
+TRANSACTIONS_NAMESPACE = b'transactions:'
+STATES_NAMESPACE = b'states:'
+INDEXES_NAMESPACE = b'indexes:'
+
+HEADER_HEIGHT_PREFIX = b'h'
+CHAIN_TIP_KEY = b'chain_tip'
+STATE_ENTRY_PREFIX = b'entry:'
+STATE_DELTA_PREFIX = b'delta:'
+STATE_ROOT_KEY = b'state_root'
+STATE_CHECKPOINT_PREFIX = b'checkpoint:'
+STATE_PRUNED_HEIGHT_KEY = b'pruned_height'
+STATE_IMPORT_PREFIX = b'import:'
+ACCOUNT_INDEX_PREFIX = b'a'
+HEIGHT_INDEX_PREFIX = b'n'
+BLOCK_LOCATION_PREFIX = b'l'
+BLOCK_HEIGHT_LOCATION_PREFIX = b'p'
+# Keys pack heights as unsigned 64-bit and transaction indexes as unsigned 32-bit integers
+HEIGHT_LIMIT = 2 ** 64
+TRANSACTION_INDEX_LIMIT = 2 ** 32
+
 app = web.Application()
     
 class TransactionPool:
@@ -53,6 +94,7 @@ class Forger:
         self.in_memory_blocks = {}  # P7e15
         self.in_memory_block_headers = {}  # P7e15
         self.current_proposer_index = 0  # Initialize the current proposer index
+        self.execution_cache = ExecutionCache(max_entries=EXECUTION_CACHE_MAX_ENTRIES)
 
     @staticmethod
     def generate_block_hash(merkle_root, timestamp, state_root, previous_block_hash, chain_id):
@@ -62,30 +104,38 @@ class Forger:
 
     @staticmethod
     def compute_merkle_root(transaction_hashes):
-        if len(transaction_hashes) == 0:
-            return blake3.blake3(b'').hexdigest()
-
-        while len(transaction_hashes) > 1:
-            if len(transaction_hashes) % 2 != 0:
-                transaction_hashes.append(transaction_hashes[-1])
-
-            if isinstance(transaction_hashes[0], bytes):
-                transaction_hashes = [blake3.blake3(transaction_hashes[i] + transaction_hashes[i + 1]).digest() for i in range(0, len(transaction_hashes), 2)]
-            elif isinstance(transaction_hashes[0], str):
-                transaction_hashes = [blake3.blake3(transaction_hashes[i].encode() + transaction_hashes[i + 1].encode()).digest() for i in range(0, len(transaction_hashes), 2)]
-            else:
-                raise TypeError("Unsupported data type in transaction_hashes")
-            
-        if isinstance(transaction_hashes[0], str):
-            transaction_hashes[0] = transaction_hashes[0].encode('utf-8')
-
-        return blake3.blake3(transaction_hashes[0]).hexdigest()
+        return transaction_merkle_root(transaction_hashes)
+
+    def execute_block(self, previous_block_header, transactions, proposer):
+        """Validates and executes transactions on the parent state, returning (valid_transactions, state_root, new_state, state_trie).
+
+        Validation only depends on the parent state, so a repeated header is served from the cache whole.
+        """
+        key = self.execution_cache.key(previous_block_header.state_root, proposer, transactions)
+        result = self.execution_cache.get(key)
+        if result is not None:
+            return result
+        valid_transactions = [t for t, valid in zip(transactions, self.validation_engine.validate_transactions(transactions)) if valid]
+        current_state = self.storage_engine.fetch_state(previous_block_header.state_root)
+        tvm_engine = TinyVMEngine(current_state)
+        state_root, new_state = tvm_engine.exec(valid_transactions, proposer)
+        if tvm_engine.trace is not None:
+            self.export_execution_trace(previous_block_header.height + 1, state_root, tvm_engine.trace)
+        result = (valid_transactions, state_root, new_state, tvm_engine.state_trie)
+        self.execution_cache.put(key, result)
+        return result
+
+    def export_execution_trace(self, height, state_root, trace):
+        logging.info(f"TinyVM: Executed {len(trace.transactions)} transactions in {sum(trace.phases.values()) / 1e6:.2f} ms ({', '.join(f'{phase} {ns / 1e6:.2f} ms' for phase, ns in trace.phases.items())})")
+        if VM_TRACE_DIRECTORY is None:
+            return
+        try:
+            trace.export(os.path.join(VM_TRACE_DIRECTORY, f"{height:08d}-{state_root}.json"))
+        except OSError as e:
+            logging.error(f"Failed to export execution trace: {e}")
 
     def fetch_current_validator_set(self):
-        staking_contract_state = self.storage_engine.fetch_contract_state("7374616b696e67")
-        if staking_contract_state:
-            return sorted(staking_contract_state.keys(), key=lambda k: staking_contract_state[k]['index'])
-        return []
+        return self.storage_engine.fetch_validator_set()
 
     def select_proposer(self):
         validator_set = self.fetch_current_validator_set()
@@ -100,7 +150,7 @@ class Forger:
     def validate_block(self, block_header):
         if not self.validation_engine.validate_block_header_signatures(block_header):
             return False
-        if not self.validation_engine.validate_enough_signatures(block_header, required_signatures=2/3 * len(self.fetch_current_validator_set())):
+        if not self.validation_engine.validate_enough_signatures(block_header, required_signatures=self.fetch_current_validator_set().quorum):
             return False
         return True
 
@@ -108,18 +158,13 @@ class Forger:
         logging.info("Starting to forge a new block")
         transactions_to_forge = self.get_transactions_to_forge()
 
-        valid_transactions_to_forge = [t for t in transactions_to_forge if self.validation_engine.validate_transaction(t)]
-
         previous_block_header = self.storage_engine.fetch_last_block_header()
         previous_block_hash = previous_block_header.block_hash
         height = previous_block_header.height + 1
-        current_state = self.storage_engine.fetch_state(previous_block_header.state_root)
-
-        tvm_engine = TinyVMEngine(current_state)
 
         self.proposer = self.wallet.get_address()
         timestamp = int(time.time())
-        state_root, new_state = tvm_engine.exec(valid_transactions_to_forge, self.proposer)
+        valid_transactions_to_forge, state_root, new_state, state_trie = self.execute_block(previous_block_header, transactions_to_forge, self.proposer)
         transaction_hashes = [t.to_dict()['transaction_hash'] for t in valid_transactions_to_forge]
         merkle_root = self.compute_merkle_root(transaction_hashes)
         chain_id = "tinychain"
@@ -142,17 +187,10 @@ class Forger:
         logging.info("Starting to replay a block")
         transactions_to_forge = self.get_transactions_to_forge(block_header)
 
-        valid_transactions_to_forge = [t for t in transactions_to_forge if self.validation_engine.validate_transaction(t)]
-
         previous_block_header = self.storage_engine.fetch_last_block_header()
-        current_state = self.storage_engine.fetch_state(previous_block_header.state_root)
-
-        tvm_engine = TinyVMEngine(current_state)
-
-        state_root, new_state = tvm_engine.exec(valid_transactions_to_forge, block_header.proposer)
+        valid_transactions_to_forge, state_root, new_state, state_trie = self.execute_block(previous_block_header, transactions_to_forge, block_header.proposer)
         if state_root == block_header.state_root:
-            transaction_hashes = [t.to_dict()['transaction_hash'] for t in block_header.transactions]
-            computed_merkle_root = self.compute_merkle_root(transaction_hashes)
+            computed_merkle_root = self.compute_merkle_root(block_header.transaction_hashes)
             if computed_merkle_root == block_header.merkle_root:
                 signature = self.wallet.sign_message(block_header.block_hash)
                 validator_index = self.get_validator_index(self.validator)
@@ -181,8 +219,8 @@ class Forger:
 
         broadcast_block_header(block_header)
 
-        if block.header.has_enough_signatures(required_signatures=2/3 * len(self.fetch_current_validator_set())):
-            self.store_block_procedure(block, new_state)
+        if block.header.has_enough_signatures(required_signatures=self.fetch_current_validator_set().quorum):
+            self.store_block_procedure(block, new_state, state_trie)
             return True
         else:
             del self.in_memory_blocks[block.header.block_hash]
@@ -249,7 +287,7 @@ class Forger:
 
         block = Block(block_header, transactions_to_forge)
 
-        self.store_block_procedure(block, new_state)
+        self.store_block_procedure(block, new_state, tvm_engine.state_trie)
         return True
 
     def get_transactions_to_forge(self, block_header=None):
@@ -279,21 +317,18 @@ class Forger:
             transaction_hashes
         )
 
-    def store_block_procedure(self, block, new_state):
+    def store_block_procedure(self, block, new_state, state_trie=None):
         logging.info("Storing block with hash: %s", block.header.block_hash)
-        self.storage_engine.store_block(block)
-        self.storage_engine.store_block_header(block.header)
-        self.storage_engine.store_state(block.header.state_root, new_state)
+        committed = self.storage_engine.commit_block(block, new_state, state_trie)
+        if committed:
+            self.validation_engine.forget_block_signatures(block)
+        return committed
 
     def has_enough_signatures(self, block_header):
-        required_signatures = 2/3 * len(self.fetch_current_validator_set())
-        return block_header.has_enough_signatures(required_signatures)
+        return self.fetch_current_validator_set().has_quorum(block_header.count_signatures())
 
     def get_validator_index(self, validator_address):
-        staking_contract_state = self.storage_engine.fetch_contract_state("7374616b696e67")
-        if staking_contract_state and validator_address in staking_contract_state:
-            return staking_contract_state[validator_address]['index']
-        return -1
+        return self.fetch_current_validator_set().index_of(validator_address)
 
     async def check_round_robin_result(self):
         while True:
@@ -331,194 +366,840 @@ class Forger:
                         self.forge_new_block()
                     break
 
-class StorageEngine:
+class PrefixedSnapshot:
+    # plyvel only hands out snapshots per prefixed db, so one namespace of a whole-db snapshot is wrapped here
+    def __init__(self, snapshot, prefix):
+        self.snapshot = snapshot
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        return self.snapshot.get(self.prefix + key, default)
+
+    def iterator(self, prefix=b'', start=None, stop=None, reverse=False, include_value=True):
+        if start is None and stop is None:
+            iterator = self.snapshot.iterator(prefix=self.prefix + prefix, reverse=reverse, include_value=include_value)
+        else:
+            start = self.prefix + (start if start is not None else prefix)
+            stop = self.prefix + stop if stop is not None else None
+            iterator = self.snapshot.iterator(start=start, stop=stop, reverse=reverse, include_value=include_value)
+        return PrefixedSnapshotIterator(iterator, self.prefix, include_value)
+
+class PrefixedSnapshotIterator:
+    def __init__(self, iterator, prefix, include_value):
+        self.iterator = iterator
+        self.prefix = prefix
+        self.include_value = include_value
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self.iterator)
+        if self.include_value:
+            return item[0][len(self.prefix):], item[1]
+        return item[len(self.prefix):]
+
+    def seek(self, target):
+        self.iterator.seek(self.prefix + target)
+
+class StorageReader:
+    """Read methods shared by the StorageEngine and its ReadViews.
+
+    Subclasses provide the db_* namespaces, block_store, last_block_header, state_root, state_cache, state_tries and validator_sets.
+    """
+
+    @staticmethod
+    def height_key(height):
+        # Fixed-width big-endian keys sort numerically, so the tip is the last key
+        return HEADER_HEIGHT_PREFIX + struct.pack('>Q', height)
+
+    @staticmethod
+    def account_index_prefix(address):
+        try:
+            raw_address = b'\x00' + bytes.fromhex(address)
+        except ValueError:
+            raw_address = b'\x01' + address.encode()
+        return ACCOUNT_INDEX_PREFIX + struct.pack('>H', len(raw_address)) + raw_address
+
+    @staticmethod
+    def height_index_key(height):
+        return HEIGHT_INDEX_PREFIX + struct.pack('>Q', height)
+
+    @staticmethod
+    def state_entry_key(contract_address, key, entry_prefix=STATE_ENTRY_PREFIX):
+        return entry_prefix + contract_address.encode() + b':' + key.encode()
+
+    def fetch_state_root(self):
+        if self.state_root is None and self.db_states is not None:
+            state_root = self.db_states.get(STATE_ROOT_KEY)
+            self.state_root = state_root.decode() if state_root is not None else None
+        return self.state_root
+
+    def fetch_state_delta(self, state_root, db_states=None):
+        db_states = db_states or self.db_states
+        delta_data = db_states.get(STATE_DELTA_PREFIX + state_root.encode())
+        return serialization.decode_value(delta_data) if delta_data is not None else None
+
+    def fetch_state_overrides(self, state_root, db_states=None, tip_root=None):
+        # Walks the deltas back from the tip, collecting the values each entry had at state_root
+        overrides = {}
+        current_root = tip_root if db_states is not None else self.fetch_state_root()
+        while current_root != state_root:
+            delta = self.fetch_state_delta(current_root, db_states) if current_root is not None else None
+            if delta is None:
+                return None
+            for contract_address, entries in delta['undo'].items():
+                for key, value in entries.items():
+                    overrides[(contract_address, key)] = to_record(value)
+            current_root = delta['parent']
+        return overrides
+
+    def resolve_state(self, state_root):
+        """Returns (overrides, entry_prefix) for reading state_root, or None once it is pruned.
+
+        Entries are read under entry_prefix, except where overrides has a value.
+        """
+        if state_root is None:
+            return None
+        if state_root == self.fetch_state_root():
+            return {}, STATE_ENTRY_PREFIX
+        overrides = self.fetch_state_overrides(state_root)
+        if overrides is not None:
+            return overrides, STATE_ENTRY_PREFIX
+        if self.db_states.get(STATE_CHECKPOINT_PREFIX + state_root.encode()) is not None:
+            return {}, self.checkpoint_entry_prefix(state_root)
+        return None
+
+    def fetch_account(self, contract_address, key, state_root=None):
+        if state_root is None:
+            state_root = self.fetch_state_root()
+        value = self.state_cache.get(state_root, (contract_address, key))
+        if value is not MISSING:
+            return value
+
+        resolved = self.resolve_state(state_root)
+        if resolved is None:
+            return None
+        overrides, entry_prefix = resolved
+        if (contract_address, key) in overrides:
+            value = overrides[(contract_address, key)]
+        else:
+            entry_data = self.db_states.get(self.state_entry_key(contract_address, key, entry_prefix))
+            value = serialization.decode_state_value(entry_data) if entry_data is not None else None
+        self.state_cache.put(state_root, (contract_address, key), value)
+        return value
+
+    def iterate_contract_keys(self, contract_address, state_root):
+        overrides, entry_prefix = self.resolve_state(state_root) or ({}, None)
+        if entry_prefix is None:
+            return
+        prefix = self.state_entry_key(contract_address, '', entry_prefix)
+        for entry_key in self.db_states.iterator(prefix=prefix, include_value=False):
+            key = entry_key[len(prefix):].decode()
+            if overrides.get((contract_address, key), True) is not None:
+                yield key
+        for (override_contract, key), value in overrides.items():
+            if override_contract == contract_address and value is not None and self.db_states.get(prefix + key.encode()) is None:
+                yield key
+
+    def iterate_contracts(self, state_root):
+        overrides, entry_prefix = self.resolve_state(state_root) or ({}, None)
+        if entry_prefix is None:
+            return []
+        contract_addresses = set()
+        iterator = self.db_states.iterator(prefix=entry_prefix, include_value=False)
+        for entry_key in iterator:
+            contract_address = entry_key[len(entry_prefix):].split(b':', 1)[0]
+            contract_addresses.add(contract_address.decode())
+            iterator.seek(entry_prefix + contract_address + b';')
+        contract_addresses.update(contract_address for contract_address, key in overrides)
+        return sorted(contract_addresses)
+
+    @staticmethod
+    def checkpoint_entry_prefix(state_root):
+        return STATE_CHECKPOINT_PREFIX + state_root.encode() + b'/'
+
+    def fetch_balance(self, account_address):
+        account_data = self.fetch_account("6163636f756e7473", account_address)
+        if account_data is not None:
+            return account_data.balance, account_data.nonce
+        return None, None
+
+    def fetch_block_hash(self, height):
+        block_hash = self.db_indexes.get(self.height_index_key(height))
+        return block_hash.decode() if block_hash is not None else None
+
+    def fetch_block_by_height(self, height):
+        block_hash = self.fetch_block_hash(height)
+        return self.fetch_block(block_hash) if block_hash is not None else None
+
+    def fetch_account_transactions(self, account_address, limit, before=None):
+        # Newest first; before is the (height, transaction_index) cursor returned by the previous page
+        prefix = self.account_index_prefix(account_address)
+        if before is None:
+            iterator = self.db_indexes.iterator(prefix=prefix, reverse=True)
+        else:
+            iterator = self.db_indexes.iterator(start=prefix, stop=prefix + struct.pack('>QI', *before), reverse=True)
+
+        history = []
+        for index_key, transaction_hash in iterator:
+            height, transaction_index = struct.unpack('>QI', index_key[len(prefix):])
+            history.append((height, transaction_index, transaction_hash.decode()))
+            if len(history) == limit:
+                break
+        return history
+
+    @staticmethod
+    def block_location_key(block_hash):
+        return BLOCK_LOCATION_PREFIX + block_hash.encode()
+
+    @staticmethod
+    def block_height_location_key(height):
+        return BLOCK_HEIGHT_LOCATION_PREFIX + struct.pack('>Q', height)
+
+    def fetch_block_data(self, block_hash):
+        if self.block_store is not None:
+            location = self.db_indexes.get(self.block_location_key(block_hash))
+            if location is not None:
+                return self.block_store.read(*decode_location(location))
+        # Blocks stored before the segment store was enabled stay in LevelDB
+        return self.db_blocks.get(block_hash.encode())
+
+    def iterate_block_data(self, start_height, stop_height):
+        """Yields (height, encoded block) for the stored blocks in [start_height, stop_height).
+
+        With the segment store the blocks are memoryviews into the mapped segments, not copies.
+        """
+        if self.block_store is not None:
+            start = self.block_height_location_key(start_height)
+            stop = self.block_height_location_key(stop_height)
+            for location_key, location in self.db_indexes.iterator(start=start, stop=stop):
+                height = struct.unpack('>Q', location_key[len(BLOCK_HEIGHT_LOCATION_PREFIX):])[0]
+                yield height, self.block_store.read(*decode_location(location))
+            return
+        for height in range(start_height, stop_height):
+            block_hash = self.fetch_block_hash(height)
+            block_data = self.db_blocks.get(block_hash.encode()) if block_hash is not None else None
+            if block_data is not None:
+                yield height, block_data
+
+    def fetch_block(self, block_hash):
+        block_data = self.fetch_block_data(block_hash)
+        return serialization.decode_block(block_data) if block_data is not None else None
+
+    def fetch_last_block_header(self):
+        if self.last_block_header is None and self.db_headers is not None:
+            tip_key = self.db_headers.get(CHAIN_TIP_KEY)
+            if tip_key is None:
+                tip_key = next(self.db_headers.iterator(prefix=HEADER_HEIGHT_PREFIX, reverse=True, include_value=False), None)
+            if tip_key is not None:
+                header_data = self.db_headers.get(tip_key)
+                self.last_block_header = BlockHeader.from_dict(serialization.decode_block_header(header_data))
+        return self.last_block_header
+
+    def fetch_block_header(self, height):
+        header_data = self.db_headers.get(self.height_key(height))
+        return BlockHeader.from_dict(serialization.decode_block_header(header_data)) if header_data is not None else None
+
+    def fetch_transaction(self, transaction_hash):
+        transaction_data = self.db_transactions.get(transaction_hash.encode())
+        return serialization.decode_transaction(transaction_data) if transaction_data is not None else None
+
+    def locate_transaction(self, transaction_hash):
+        """Returns (block_header, transaction_index) for a confirmed transaction, or None."""
+        transaction_data = self.fetch_transaction(transaction_hash)
+        if transaction_data is None or transaction_data.get('confirmed') is None:
+            return None
+        block_header = self.fetch_block_header(transaction_data['confirmed'])
+        if block_header is None or transaction_hash not in block_header.transaction_hashes:
+            return None
+        return block_header, block_header.transaction_hashes.index(transaction_hash)
+
+    def get_nonce_for_account(self, account_address):
+        account_data = self.fetch_account("6163636f756e7473", account_address)
+        if account_data is not None:
+            if isinstance(account_data, Account):
+                return account_data.balance, account_data.nonce
+            else:
+                return account_data, 0
+        return 0, 0
+
+    def fetch_state_trie(self, state_root):
+        state_trie = self.state_tries.get(state_root)
+        if state_trie is not None:
+            return state_trie
+        state = self.fetch_state(state_root)
+        if state is None:
+            return None
+        state_trie = StateTrie.from_entries(((contract_address, key), value) for contract_address, entries in state.to_dict().items() for key, value in entries.items())
+        self.remember_state_trie(state_root, state_trie)
+        return state_trie
+
+    def remember_state_trie(self, state_root, state_trie):
+        self.state_tries.put(state_root, state_trie)
+
+    def has_state(self, state_root):
+        return self.resolve_state(state_root) is not None
+
+    def fetch_state(self, state_root):
+        if state_root is None or not self.has_state(state_root):
+            return None
+        return WorldState(self, state_root)
+
+    def fetch_contract_state(self, contract_address):
+        last_block_header = self.fetch_last_block_header()
+        state_root = last_block_header.state_root if last_block_header is not None else self.fetch_state_root()
+        state = self.fetch_state(state_root)
+        return state[contract_address] if state is not None else None
+
+    def fetch_validator_set(self, state_root=None):
+        """Returns the ValidatorSet at state_root, or at the tip when state_root is None."""
+        if state_root is None:
+            last_block_header = self.fetch_last_block_header()
+            state_root = last_block_header.state_root if last_block_header is not None else self.fetch_state_root()
+        validator_set = self.validator_sets.get(state_root)
+        if validator_set is not None:
+            return validator_set
+        if state_root is None or not self.has_state(state_root):
+            return ValidatorSet({})
+        stake_entries = {address: self.fetch_account(STAKING_CONTRACT_ADDRESS, address, state_root) for address in self.iterate_contract_keys(STAKING_CONTRACT_ADDRESS, state_root)}
+        validator_set = ValidatorSet(stake_entries)
+        self.remember_validator_set(state_root, validator_set)
+        return validator_set
+
+    def remember_validator_set(self, state_root, validator_set):
+        self.validator_sets.put(state_root, validator_set)
+
+class ReadView(StorageReader):
+    """Read-only view of the chain pinned to one committed block.
+
+    Reads go through a LevelDB snapshot, so a view never sees a block that is
+    committed after it was taken.
+    """
+
+    def __init__(self, db, state_cache, state_tries, validator_sets, block_store):
+        self.snapshot = db.snapshot()
+        self.db_headers = PrefixedSnapshot(self.snapshot, HEADERS_NAMESPACE)
+        self.db_blocks = PrefixedSnapshot(self.snapshot, BLOCKS_NAMESPACE)
+        self.db_transactions = PrefixedSnapshot(self.snapshot, TRANSACTIONS_NAMESPACE)
+        self.db_states = PrefixedSnapshot(self.snapshot, STATES_NAMESPACE)
+        self.db_indexes = PrefixedSnapshot(self.snapshot, INDEXES_NAMESPACE)
+        # Entries, tries and validator sets are cached per state root, so the view can share the engine's caches
+        self.state_cache = state_cache
+        self.state_tries = state_tries
+        self.validator_sets = validator_sets
+        # Segments are append-only, so blocks the snapshot's index points at never change
+        self.block_store = block_store
+        self.last_block_header = None
+        self.state_root = None
+
+class StorageEngine(StorageReader):
+
     def __init__(self, transactionpool):
         self.transactionpool = transactionpool
+        self.db = None
         self.db_headers = None
         self.db_blocks = None
         self.db_transactions = None
         self.db_states = None
-        self.state = []
+        self.db_indexes = None
+        self.last_block_header = None
+        self.state_cache = StateCache(max_roots=STATE_CACHE_MAX_ROOTS, max_entries=STATE_CACHE_MAX_ENTRIES)
+        self.state_root = None
+        # Tries share their unchanged nodes, so holding a few recent roots costs little more than the tip
+        self.state_tries = RootCache(max_roots=STATE_CACHE_MAX_ROOTS)
+        self.validator_sets = RootCache(max_roots=STATE_CACHE_MAX_ROOTS)
+        self.read_view = None
+        self.block_store = None
 
     def open_databases(self):
         try:
-            self.db_headers = plyvel.DB('headers.db', create_if_missing=True)
-            self.db_blocks = plyvel.DB('blocks.db', create_if_missing=True)
-            self.db_transactions = plyvel.DB('transactions.db', create_if_missing=True)
-            self.db_states = plyvel.DB('states.db', create_if_missing=True)
+            self.db = plyvel.DB(DATABASE_PATH, create_if_missing=True)
+            self.db_headers = self.db.prefixed_db(HEADERS_NAMESPACE)
+            self.db_blocks = self.db.prefixed_db(BLOCKS_NAMESPACE)
+            self.db_transactions = self.db.prefixed_db(TRANSACTIONS_NAMESPACE)
+            self.db_states = self.db.prefixed_db(STATES_NAMESPACE)
+            self.db_indexes = self.db.prefixed_db(INDEXES_NAMESPACE)
+            if BLOCK_STORE_BACKEND == 'segments':
+                self.block_store = SegmentBlockStore(BLOCK_SEGMENT_DIRECTORY, BLOCK_SEGMENT_SIZE)
+            self.migrate_legacy_databases()
+            self.migrate_header_keys()
+            self.migrate_state_layout()
+            self.build_indexes()
             headers = self.db_headers.iterator()
             if not any(headers):
-                forger.commit_genesis_block()
+                if SNAPSHOT_SOURCE:
+                    self.import_snapshot_from(SNAPSHOT_SOURCE)
+                else:
+                    forger.commit_genesis_block()
             else:
                 logging.info("Databases already initialized")
+            self.refresh_read_view()
 
         except Exception as err:
             logging.error("Failed to open databases: %s", err)
             raise
 
+    def migrate_legacy_databases(self):
+        legacy_databases = [('headers.db', self.db_headers), ('blocks.db', self.db_blocks), ('transactions.db', self.db_transactions), ('states.db', self.db_states)]
+        for path, namespace in legacy_databases:
+            if not os.path.isdir(path):
+                continue
+            legacy_db = plyvel.DB(path)
+            with namespace.write_batch() as batch:
+                for key, value in legacy_db:
+                    batch.put(key, value)
+            legacy_db.close()
+            os.rename(path, path + '.migrated')
+            logging.info("Migrated %s into %s", path, DATABASE_PATH)
+
+    def migrate_header_keys(self):
+        legacy_keys = [key for key in self.db_headers.iterator(include_value=False) if key.isdigit()]
+        if not legacy_keys:
+            return
+        with self.db_headers.write_batch() as batch:
+            for key in legacy_keys:
+                batch.put(self.height_key(int(key)), self.db_headers.get(key))
+                batch.delete(key)
+            tip_key = max(self.height_key(int(key)) for key in legacy_keys)
+            batch.put(CHAIN_TIP_KEY, tip_key)
+        logging.info("Migrated %s block headers to fixed-width height keys", len(legacy_keys))
+
+    def migrate_state_layout(self):
+        if self.db_states.get(STATE_ROOT_KEY) is not None:
+            return
+        legacy_keys = [key for key in self.db_states.iterator(include_value=False) if all(c in b'0123456789abcdef' for c in key)]
+        if not legacy_keys:
+            return
+        last_block_header = self.fetch_last_block_header()
+        state_data = self.db_states.get(last_block_header.state_root.encode()) if last_block_header is not None else None
+        if state_data is not None:
+            self.store_state(last_block_header.state_root, json.loads(state_data.decode()))
+        with self.db_states.write_batch() as batch:
+            for key in legacy_keys:
+                batch.delete(key)
+        logging.info("Migrated tip state to per-account keys, dropped %s whole-state records", len(legacy_keys))
+
+    def build_indexes(self):
+        if next(self.db_indexes.iterator(include_value=False), None) is not None:
+            return
+        if self.block_store is not None:
+            self.index_block_segments()
+        block_count = 0
+        for header_key, header_data in self.db_headers.iterator(prefix=HEADER_HEIGHT_PREFIX):
+            block_header = BlockHeader.from_dict(serialization.decode_block_header(header_data))
+            block_data = self.fetch_block(block_header.block_hash)
+            if block_data is None:
+                continue
+            transactions = [Transaction(**{k: v for k, v in t.items() if k not in ('transaction_hash', 'confirmed')}) for t in block_data['transactions']]
+            with self.db.write_batch() as batch:
+                self.write_block_indexes(batch, Block(block_header, transactions))
+            block_count += 1
+        if block_count:
+            logging.info("Indexed %s existing blocks", block_count)
+
+    def index_block_segments(self):
+        block_count = 0
+        orphan_count = 0
+        for segment in self.block_store.segments():
+            for offset, block_data in self.block_store.scan(segment):
+                block = serialization.decode_block(block_data)
+                # A crash between the append and the batch commit leaves a record no header points at
+                block_header = self.fetch_block_header(block['height'])
+                if block_header is None or block_header.block_hash != block['block_hash']:
+                    orphan_count += 1
+                    continue
+                location = encode_location(segment, offset, len(block_data))
+                self.db_indexes.put(self.block_location_key(block['block_hash']), location)
+                self.db_indexes.put(self.block_height_location_key(block['height']), location)
+                block_count += 1
+        if block_count:
+            logging.info("Indexed %s blocks from segments", block_count)
+        if orphan_count:
+            logging.info("Skipped %s uncommitted block records in segments", orphan_count)
+
+    def refresh_read_view(self):
+        # Handlers holding the previous view keep its snapshot alive until they finish
+        self.read_view = ReadView(self.db, self.state_cache, self.state_tries, self.validator_sets, self.block_store)
+
+    def get_read_view(self):
+        if self.read_view is None:
+            self.refresh_read_view()
+        return self.read_view
+
     def close_databases(self):
         try:
-            if self.db_headers:
-                self.db_headers.close()
-            if self.db_blocks:
-                self.db_blocks.close()
-            if self.db_transactions:
-                self.db_transactions.close()
-            if self.db_states:
-                self.db_states.close()
+            self.read_view = None
+            if self.block_store is not None:
+                self.block_store.close()
+            if self.db:
+                self.db.close()
         except Exception as err:
             logging.error("Failed to close databases: %s", err)
             raise
 
-    def store_block(self, block):
+    def commit_block(self, block, new_state, state_trie=None):
+        # Block, header, transactions and state land in one synced batch, so a crash cannot leave a torn chain
+        if block.header.state_root is None:
+            logging.error("Block storage skipped: 'NoneType' object has no attribute 'state_root'")
+            return False
         try:
-            if block.header.state_root is None:
-                logging.error("Block storage skipped: 'NoneType' object has no attribute 'state_root'")
-                return
-            
-            for transaction in block.transactions:
-                transaction.confirmed = block.header.height
-                self.store_transaction(transaction)
-                self.transactionpool.remove_transaction(transaction)
-                self.set_nonce_for_account(transaction.sender, transaction.nonce + 1)
-
-            block_data = {
-                'block_hash': block.header.block_hash,
-                'height': block.header.height,
-                'timestamp': block.header.timestamp,
-                'merkle_root': block.header.merkle_root,
-                'state_root': block.header.state_root,
-                'previous_block_hash': block.header.previous_block_hash,
-                'proposer': block.header.proposer,
-                'chain_id': block.header.chain_id,
-                'signatures': [sig.to_dict() for sig in block.header.signatures],
-                'transactions': [transaction.to_dict() for transaction in block.transactions]
-            }
-
-            self.db_blocks.put(block.header.block_hash.encode(), json.dumps(block_data).encode())
-
-            logging.info("Stored block: %s at height %s", block.header.block_hash, block.header.height)
+            with self.db.write_batch(transaction=True, sync=True) as batch:
+                self.write_block(batch, block)
+                is_tip = self.write_block_header(batch, block.header)
+                state_update = self.write_state(batch, block.header.state_root, new_state)
         except Exception as err:
-            logging.error("Failed to store block: %s", err)
+            logging.error("Failed to commit block %s: %s", block.header.block_hash, err)
+            return False
 
-    def store_block_header(self, block_header):
-        try:
-            block_header_data = {
-                'block_hash': block_header.block_hash,
-                'height': block_header.height,
-                'timestamp': block_header.timestamp,
-                'merkle_root': block_header.merkle_root,
-                'state_root': block_header.state_root,
-                'previous_block_hash': block_header.previous_block_hash,
-                'proposer': block_header.proposer,
-                'chain_id': block_header.chain_id,
-                'signatures': [sig.to_dict() for sig in block_header.signatures],
-                'transaction_hashes': block_header.transaction_hashes
-            }
-
-            self.db_headers.put(str(block_header.height).encode(), json.dumps(block_header_data).encode())
-
-            logging.info("Stored block header: %s at height %s", block_header.block_hash, block_header.height)
-        except Exception as err:
-            logging.error("Failed to store block header: %s", err)
+        if is_tip:
+            self.last_block_header = block.header
+        if state_update is not None:
+            self.apply_state_update(*state_update, state_trie)
+        self.refresh_read_view()
+        for transaction in block.transactions:
+            self.transactionpool.remove_transaction(transaction)
+        logging.info("Committed block: %s at height %s", block.header.block_hash, block.header.height)
+        return True
 
-    def store_transaction(self, transaction):
-        try:
-            transaction_data = {
-                'transaction_hash': transaction.transaction_hash,
-                "sender": transaction.sender,
-                "receiver": transaction.receiver,
-                "amount": transaction.amount,
-                "fee": transaction.fee,
-                "nonce": transaction.nonce,
-                "signature": transaction.signature,
-                "memo": transaction.memo,
-                "confirmed": transaction.confirmed
-            }
-            self.db_transactions.put(transaction.transaction_hash.encode(), json.dumps(transaction_data).encode('utf-8'))
-            logging.info("Stored transaction: %s", transaction.transaction_hash)
-        except Exception as err:
-            logging.error("Failed to store transaction: %s", err)
+    def write_block(self, batch, block):
+        for transaction in block.transactions:
+            transaction.confirmed = block.header.height
+            self.write_transaction(batch, transaction)
+
+        block_data = {
+            'block_hash': block.header.block_hash,
+            'height': block.header.height,
+            'timestamp': block.header.timestamp,
+            'merkle_root': block.header.merkle_root,
+            'state_root': block.header.state_root,
+            'previous_block_hash': block.header.previous_block_hash,
+            'proposer': block.header.proposer,
+            'chain_id': block.header.chain_id,
+            'signatures': [sig.to_dict() for sig in block.header.signatures],
+            'transactions': [transaction.to_dict() for transaction in block.transactions]
+        }
+
+        encoded_block = serialization.encode_block(block_data)
+        if self.block_store is not None:
+            # The body is synced to its segment before the batch commits, so the index never points past it
+            location = encode_location(*self.block_store.append(encoded_block))
+            batch.put(INDEXES_NAMESPACE + self.block_location_key(block.header.block_hash), location)
+            batch.put(INDEXES_NAMESPACE + self.block_height_location_key(block.header.height), location)
+        else:
+            batch.put(BLOCKS_NAMESPACE + block.header.block_hash.encode(), encoded_block)
+        self.write_block_indexes(batch, block)
+
+    def write_block_indexes(self, batch, block):
+        height = block.header.height
+        batch.put(INDEXES_NAMESPACE + self.height_index_key(height), block.header.block_hash.encode())
+        for transaction_index, transaction in enumerate(block.transactions):
+            position = struct.pack('>QI', height, transaction_index)
+            for address in {transaction.sender, transaction.receiver}:
+                batch.put(INDEXES_NAMESPACE + self.account_index_prefix(address) + position, transaction.transaction_hash.encode())
+
+    def write_block_header(self, batch, block_header):
+        block_header_data = {
+            'block_hash': block_header.block_hash,
+            'height': block_header.height,
+            'timestamp': block_header.timestamp,
+            'merkle_root': block_header.merkle_root,
+            'state_root': block_header.state_root,
+            'previous_block_hash': block_header.previous_block_hash,
+            'proposer': block_header.proposer,
+            'chain_id': block_header.chain_id,
+            'signatures': [sig.to_dict() for sig in block_header.signatures],
+            'transaction_hashes': block_header.transaction_hashes
+        }
+
+        header_key = self.height_key(block_header.height)
+        last_block_header = self.fetch_last_block_header()
+        is_tip = last_block_header is None or block_header.height >= last_block_header.height
+        batch.put(HEADERS_NAMESPACE + header_key, serialization.encode_block_header(block_header_data))
+        if is_tip:
+            batch.put(HEADERS_NAMESPACE + CHAIN_TIP_KEY, header_key)
+        return is_tip
+
+    def write_transaction(self, batch, transaction):
+        transaction_data = {
+            'transaction_hash': transaction.transaction_hash,
+            "sender": transaction.sender,
+            "receiver": transaction.receiver,
+            "amount": transaction.amount,
+            "fee": transaction.fee,
+            "nonce": transaction.nonce,
+            "signature": transaction.signature,
+            "memo": transaction.memo,
+            "confirmed": transaction.confirmed
+        }
+        batch.put(TRANSACTIONS_NAMESPACE + transaction.transaction_hash.encode(), serialization.encode_transaction(transaction_data))
 
     def store_state(self, state_root, state):
         try:
-            self.db_states.put(state_root.encode(), json.dumps(state).encode())
+            with self.db.write_batch(transaction=True) as batch:
+                state_update = self.write_state(batch, state_root, state)
+            if state_update is not None:
+                self.apply_state_update(*state_update)
             logging.info("State saved: %s", state_root)
         except Exception as err:
             logging.error("Failed to store state: %s", err)
 
-    def fetch_balance(self, account_address):
-        accounts_state = self.fetch_contract_state("6163636f756e7473")
-        if accounts_state is not None:
-            account_data = accounts_state.get(account_address, None)
-            if account_data is not None:
-                return account_data.get("balance", 0), account_data.get("nonce", 0)
-        return None, None
-
-    def fetch_block(self, block_hash):
-        block_data = self.db_blocks.get(block_hash.encode())
-        return json.loads(block_data.decode()) if block_data is not None else None
-
-    def fetch_last_block_header(self):
-        last_block_header = None
-        max_height = -1
-
-        if self.db_headers is not None:
-            for header_key, header_data in self.db_headers.iterator(reverse=True):
-                block_header = BlockHeader.from_dict(json.loads(header_data.decode()))
-                if block_header.height > max_height:
-                    max_height = block_header.height
-                    last_block_header = block_header
-        return last_block_header
-
-    def fetch_transaction(self, transaction_hash):
-        transaction_data = self.db_transactions.get(transaction_hash.encode())
-        return json.loads(transaction_data.decode()) if transaction_data is not None else None
-
-    def get_nonce_for_account(self, account_address):
-        accounts_state = self.fetch_contract_state("6163636f756e7473")
-        if accounts_state is not None:
-            account_data = accounts_state.get(account_address, None)
-            if account_data is not None:
-                if isinstance(account_data, dict):
-                    balance = account_data.get("balance", 0)
-                    nonce = account_data.get("nonce", 0)
-                    return balance, nonce
+    def write_state(self, batch, state_root, state):
+        parent_root = self.fetch_state_root()
+        if parent_root == state_root:
+            logging.info("State already stored: %s", state_root)
+            return None
+        base_state = state.base_state() if isinstance(state, StateOverlay) else None
+        if isinstance(base_state, WorldState) and base_state.state_root != parent_root:
+            raise ValueError(f"State {state_root} was not executed on the tip state")
+
+        # Only the changed entries are written, along with their previous values so older roots can be rebuilt
+        changes = state_changes(state)
+        undo = {
+            contract_address: {key: self.fetch_account(contract_address, key, parent_root) for key in entries}
+            for contract_address, entries in changes.items()
+        }
+        for contract_address, entries in changes.items():
+            for key, value in entries.items():
+                if value is None:
+                    batch.delete(STATES_NAMESPACE + self.state_entry_key(contract_address, key))
                 else:
-                    return account_data, 0
-        return 0, 0
-    
-    def set_nonce_for_account(self, account_address, nonce):
-        contract_address = "6163636f756e7473"
-        accounts_state = self.fetch_contract_state(contract_address)
-        if accounts_state is not None:
-            if account_address in accounts_state:
-                accounts_state[account_address]["nonce"] = nonce
-            else:
-                accounts_state[account_address] = {"balance": 0, "nonce": nonce}
-            self.store_contract_state(contract_address, accounts_state)
+                    batch.put(STATES_NAMESPACE + self.state_entry_key(contract_address, key), serialization.encode_state_value(value))
+        delta = {'parent': parent_root, 'changes': changes, 'undo': undo}
+        batch.put(STATES_NAMESPACE + STATE_DELTA_PREFIX + state_root.encode(), serialization.encode_value(delta))
+        batch.put(STATES_NAMESPACE + STATE_ROOT_KEY, state_root.encode())
+        return parent_root, state_root, changes
+
+    def apply_state_update(self, parent_root, state_root, changes, state_trie=None):
+        self.state_root = state_root
+        self.state_cache.advance(parent_root, state_root, changes)
+        # The VM already built the block's trie; it is only rebuilt from the parent's when none was passed
+        if state_root not in self.state_tries:
+            if state_trie is None:
+                parent_trie = self.state_tries.get(parent_root)
+                state_trie = parent_trie.update(changes) if parent_trie is not None else None
+            if state_trie is not None:
+                self.remember_state_trie(state_root, state_trie)
+        # Most blocks leave the staking contract alone and keep their parent's validator set
+        parent_validator_set = self.validator_sets.get(parent_root)
+        if parent_validator_set is not None and STAKING_CONTRACT_ADDRESS not in changes:
+            self.remember_validator_set(state_root, parent_validator_set)
+
+    def prune_states(self):
+        """Deletes state deltas older than the retained window, keeping a full checkpoint every
+        STATE_CHECKPOINT_INTERVAL blocks, then deletes all but the newest STATE_RETAIN_CHECKPOINTS
+        checkpoints. Runs off the event loop and reads through a LevelDB snapshot, so commits can
+        continue while it works."""
+        snapshot = self.db.snapshot()
+        snapshot_headers = PrefixedSnapshot(snapshot, HEADERS_NAMESPACE)
+        snapshot_states = PrefixedSnapshot(snapshot, STATES_NAMESPACE)
+        tip_key = snapshot_headers.get(CHAIN_TIP_KEY)
+        tip_root = snapshot_states.get(STATE_ROOT_KEY)
+        if tip_key is None or tip_root is None:
+            return 0
+        tip_height = struct.unpack('>Q', tip_key[len(HEADER_HEIGHT_PREFIX):])[0]
+        pruned_height = snapshot_states.get(STATE_PRUNED_HEIGHT_KEY)
+        pruned_height = struct.unpack('>q', pruned_height)[0] if pruned_height is not None else -1
+        last_height = min(tip_height - STATE_RETAIN_ROOTS, pruned_height + STATE_PRUNE_BATCH_SIZE)
+
+        for height in range(pruned_height + 1, last_height + 1):
+            header_data = snapshot_headers.get(self.height_key(height))
+            state_root = serialization.decode_block_header(header_data)['state_root'] if header_data is not None else None
+            with self.db.write_batch(transaction=True) as batch:
+                if state_root is not None:
+                    if height % STATE_CHECKPOINT_INTERVAL == 0:
+                        self.write_checkpoint(batch, snapshot_states, tip_root.decode(), state_root, height)
+                    batch.delete(STATES_NAMESPACE + STATE_DELTA_PREFIX + state_root.encode())
+                batch.put(STATES_NAMESPACE + STATE_PRUNED_HEIGHT_KEY, struct.pack('>q', height))
+        snapshot.close()
+
+        pruned = max(0, last_height - pruned_height)
+        if pruned:
+            logging.info("Pruned state deltas up to height %s", last_height)
+        self.prune_checkpoints()
+        return pruned
+
+    def prune_checkpoints(self):
+        snapshot = self.db.snapshot()
+        snapshot_states = PrefixedSnapshot(snapshot, STATES_NAMESPACE)
+        checkpoints = self.list_checkpoints(snapshot_states)
+        for height, state_root in checkpoints[:max(0, len(checkpoints) - STATE_RETAIN_CHECKPOINTS)]:
+            # The marker goes in the same batch as the entries, so readers never see a partial checkpoint
+            with self.db.write_batch(transaction=True) as batch:
+                for entry_key in snapshot_states.iterator(prefix=self.checkpoint_entry_prefix(state_root), include_value=False):
+                    batch.delete(STATES_NAMESPACE + entry_key)
+                batch.delete(STATES_NAMESPACE + STATE_CHECKPOINT_PREFIX + state_root.encode())
+            logging.info("Deleted state checkpoint %s at height %s", state_root, height)
+        snapshot.close()
 
-    def store_contract_state(self, contract_address, state_data):
+    @staticmethod
+    def list_checkpoints(snapshot_states):
+        """Returns (height, state_root) for every checkpoint, oldest first."""
+        checkpoints = []
+        iterator = snapshot_states.iterator(prefix=STATE_CHECKPOINT_PREFIX)
+        for key, value in iterator:
+            state_root, separator, _ = key[len(STATE_CHECKPOINT_PREFIX):].partition(b'/')
+            if not separator:
+                checkpoints.append((struct.unpack('>Q', value)[0], state_root.decode()))
+            # A checkpoint's entries sort right after its marker and before the next root, so they are skipped
+            iterator.seek(STATE_CHECKPOINT_PREFIX + state_root + b'0')
+        return sorted(checkpoints)
+
+    def write_checkpoint(self, batch, snapshot_states, tip_root, state_root, height):
+        overrides = self.fetch_state_overrides(state_root, snapshot_states, tip_root)
+        if overrides is None:
+            logging.error("Cannot checkpoint state %s at height %s: it is no longer reachable", state_root, height)
+            return
+        checkpoint_prefix = STATES_NAMESPACE + self.checkpoint_entry_prefix(state_root)
+        for entry_key, entry_data in snapshot_states.iterator(prefix=STATE_ENTRY_PREFIX):
+            contract_address, key = entry_key[len(STATE_ENTRY_PREFIX):].decode().split(':', 1)
+            if (contract_address, key) not in overrides:
+                batch.put(checkpoint_prefix + entry_key[len(STATE_ENTRY_PREFIX):], entry_data)
+        for (contract_address, key), value in overrides.items():
+            if value is not None:
+                batch.put(checkpoint_prefix + f"{contract_address}:{key}".encode(), serialization.encode_state_value(value))
+        batch.put(STATES_NAMESPACE + STATE_CHECKPOINT_PREFIX + state_root.encode(), struct.pack('>Q', height))
+        logging.info("Wrote state checkpoint %s at height %s", state_root, height)
+
+    def export_snapshot(self):
+        """Yields the snapshot of the committed tip as a stream of byte chunks.
+
+        Reads go through one LevelDB snapshot, chunk by chunk, so the whole state is never held in memory.
+        """
+        snapshot = self.db.snapshot()
         try:
-            self.db_states.put(contract_address.encode(), json.dumps(state_data).encode())
-            logging.info("Stored contract state for address: %s", contract_address)
-        except Exception as err:
-            logging.error("Failed to store contract state: %s", err)
-
-    def fetch_state(self, state_root):
-        state_data = self.db_states.get(state_root.encode())
-        if state_data is not None:
-            state = json.loads(state_data.decode())
-            return state
-        return None
-
-    def fetch_contract_state(self, contract_address):
-        if self.fetch_last_block_header() is not None:
-            state_root = self.fetch_last_block_header().state_root
+            snapshot_headers = PrefixedSnapshot(snapshot, HEADERS_NAMESPACE)
+            snapshot_states = PrefixedSnapshot(snapshot, STATES_NAMESPACE)
+            tip_key = snapshot_headers.get(CHAIN_TIP_KEY)
+            state_root = snapshot_states.get(STATE_ROOT_KEY)
+            if tip_key is None or state_root is None:
+                raise ValueError("No committed state to snapshot")
+            tip_header_data = snapshot_headers.get(tip_key)
+            tip_height = struct.unpack('>Q', tip_key[len(HEADER_HEIGHT_PREFIX):])[0]
+
+            yield SNAPSHOT_MAGIC
+            yield encode_frame(FRAME_TIP_HEADER, tip_header_data)
+            for height in range(max(0, tip_height - SNAPSHOT_RECENT_HEADERS), tip_height):
+                header_data = snapshot_headers.get(self.height_key(height))
+                if header_data is not None:
+                    yield encode_frame(FRAME_RECENT_HEADER, header_data)
+
+            digest = EntryDigest()
+            chunk = []
+            for entry_key, entry_data in snapshot_states.iterator(prefix=STATE_ENTRY_PREFIX):
+                chunk.append((entry_key[len(STATE_ENTRY_PREFIX):], entry_data))
+                if len(chunk) == SNAPSHOT_CHUNK_ENTRIES:
+                    digest.update(chunk)
+                    yield encode_frame(FRAME_STATE_ENTRIES, encode_entries(chunk))
+                    chunk = []
+            if chunk:
+                digest.update(chunk)
+                yield encode_frame(FRAME_STATE_ENTRIES, encode_entries(chunk))
+            yield encode_frame(FRAME_END, encode_trailer(state_root.decode(), digest.count, digest.digest()))
+        finally:
+            snapshot.close()
+
+    def import_snapshot_from(self, source):
+        logging.info("Importing state snapshot from %s", source)
+        if source.startswith('http://') or source.startswith('https://'):
+            with requests.get(source, stream=True, timeout=10) as response:
+                response.raise_for_status()
+                self.import_snapshot(response.raw)
         else:
-            state_root = "0"
-        contract_state_data = self.db_states.get(state_root.encode())
-        return json.loads(contract_state_data.decode()).get(contract_address) if contract_state_data is not None else None
+            with open(source, 'rb') as stream:
+                self.import_snapshot(stream)
+
+    def import_snapshot(self, stream):
+        frames = read_frames(stream)
+        frame_type, payload = next(frames)
+        if frame_type != FRAME_TIP_HEADER:
+            raise ValueError("Snapshot does not start with the tip header")
+        tip_header = BlockHeader.from_dict(serialization.decode_block_header(payload))
+        # The snapshot only proves it is consistent with its own tip header, so the tip itself must be pinned
+        if not SNAPSHOT_TRUSTED_BLOCK_HASH:
+            raise ValueError("SNAPSHOT_TRUSTED_BLOCK_HASH must be set to import a snapshot")
+        if tip_header.block_hash != SNAPSHOT_TRUSTED_BLOCK_HASH:
+            raise ValueError(f"Snapshot tip {tip_header.block_hash} does not match the trusted block hash")
+
+        self.clear_namespace(self.db_states)
+        recent_headers = []
+        digest = EntryDigest()
+        trailer = None
+        try:
+            for frame_type, payload in frames:
+                if frame_type == FRAME_RECENT_HEADER:
+                    recent_headers.append(BlockHeader.from_dict(serialization.decode_block_header(payload)))
+                elif frame_type == FRAME_STATE_ENTRIES:
+                    entries = decode_entries(payload)
+                    digest.update(entries)
+                    with self.db_states.write_batch() as batch:
+                        for entry_key, entry_data in entries:
+                            batch.put(STATE_ENTRY_PREFIX + entry_key, entry_data)
+                            # Leaves are staged by path, so the root can be computed from a sorted pass over them
+                            contract_address, key = entry_key.decode().split(':', 1)
+                            batch.put(STATE_IMPORT_PREFIX + entry_path(contract_address, key).to_bytes(32, 'big'), value_hash(serialization.decode_state_value(entry_data)))
+                elif frame_type == FRAME_END:
+                    trailer = decode_trailer(payload)
+                else:
+                    raise ValueError(f"Unknown snapshot frame type: {frame_type}")
+            leaves = ((int.from_bytes(leaf_key[len(STATE_IMPORT_PREFIX):], 'big'), leaf_value_hash) for leaf_key, leaf_value_hash in self.db_states.iterator(prefix=STATE_IMPORT_PREFIX))
+            self.verify_snapshot(tip_header, recent_headers, trailer, digest, sorted_root_hash(leaves))
+            with self.db_states.write_batch() as batch:
+                for leaf_key in self.db_states.iterator(prefix=STATE_IMPORT_PREFIX, include_value=False):
+                    batch.delete(leaf_key)
+        except Exception:
+            self.clear_namespace(self.db_states)
+            raise
+
+        # The tip pointer and state root land last, so an interrupted import leaves no usable tip
+        with self.db.write_batch(transaction=True, sync=True) as batch:
+            for block_header in recent_headers + [tip_header]:
+                batch.put(HEADERS_NAMESPACE + self.height_key(block_header.height), serialization.encode_block_header(block_header.to_dict()))
+                batch.put(INDEXES_NAMESPACE + self.height_index_key(block_header.height), block_header.block_hash.encode())
+            batch.put(HEADERS_NAMESPACE + CHAIN_TIP_KEY, self.height_key(tip_header.height))
+            batch.put(STATES_NAMESPACE + STATE_ROOT_KEY, tip_header.state_root.encode())
+            batch.put(STATES_NAMESPACE + STATE_PRUNED_HEIGHT_KEY, struct.pack('>q', tip_header.height - 1))
+        self.last_block_header = None
+        self.state_root = None
+        self.state_cache.clear()
+        self.state_tries.clear()
+        self.validator_sets.clear()
+        self.refresh_read_view()
+        logging.info("Imported state snapshot at height %s with %s entries", tip_header.height, digest.count)
+
+    def verify_snapshot(self, tip_header, recent_headers, trailer, digest, state_root_hash):
+        if trailer is None:
+            raise ValueError("Snapshot has no trailer")
+        state_root, entry_count, expected_digest = trailer
+        if state_root != tip_header.state_root:
+            raise ValueError(f"Snapshot state root {state_root} does not match the tip header")
+        if entry_count != digest.count or expected_digest != digest.digest():
+            raise ValueError("Snapshot state entries do not match the trailer digest")
+        if state_root_hash.hex() != tip_header.state_root:
+            raise ValueError("Snapshot state entries do not hash to the tip state root")
+
+        previous_header = None
+        for block_header in recent_headers + [tip_header]:
+            computed_hash = Forger.generate_block_hash(block_header.merkle_root, block_header.timestamp, block_header.state_root, block_header.previous_block_hash, block_header.chain_id)
+            if computed_hash != block_header.block_hash:
+                raise ValueError(f"Snapshot header hash mismatch at height {block_header.height}")
+            if previous_header is not None and (block_header.height != previous_header.height + 1 or block_header.previous_block_hash != previous_header.block_hash):
+                raise ValueError(f"Snapshot headers are not linked at height {block_header.height}")
+            previous_header = block_header
+
+    def clear_namespace(self, namespace):
+        with namespace.write_batch() as batch:
+            for key in namespace.iterator(include_value=False):
+                batch.delete(key)
+
+    async def run_state_pruner(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(STATE_PRUNE_INTERVAL)
+            try:
+                await loop.run_in_executor(None, self.prune_states)
+            except Exception as err:
+                logging.error("State pruning failed: %s", err)
 
     def close(self):
         self.close_databases()
@@ -526,32 +1207,20 @@ class StorageEngine:
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Create instances of components
-wallet = Wallet()
-if not wallet.is_initialized():
-    logging.info("Wallet is not initialized. Please run wallet_generator.py to generate a wallet.")
-    exit()
-transactionpool = TransactionPool(max_size=MAX_TX_POOL)
-storage_engine = StorageEngine(transactionpool)
-validation_engine = ValidationEngine(storage_engine)
-forger = Forger(transactionpool, storage_engine, validation_engine, wallet)
-
 
 async def send_transaction(request):
     data = await request.json()
     if 'transaction' in data:
-        transaction_data = data['transaction']
         try:
-            validate(instance=transaction_data, schema=transaction_schema)
-            transaction = Transaction(**transaction_data)
-            if validation_engine.validate_transaction(transaction):
-                if transaction.transaction_hash not in transactionpool.transactions:
-                    transactionpool.add_transaction(transaction)
-                    sender_uri = request.remote
-                    await broadcast_transaction(transaction, sender_uri)
-                    return web.json_response({'message': 'Transaction added to the transaction pool', 'transaction_hash': transaction.transaction_hash})
-        except ValidationError:
-            pass
+            transaction = await admission_pipeline.submit(data['transaction'], request.remote)
+        except asyncio.QueueFull:
+            return web.json_response({'error': 'Transaction admission queue is full'}, status=503, headers={'Retry-After': '1'})
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=503, headers={'Retry-After': str(ROUND_TIMEOUT)})
+        except RuntimeError as e:
+            return web.json_response({'error': str(e)}, status=500)
+        if transaction is not None:
+            return web.json_response({'message': 'Transaction added to the transaction pool', 'transaction_hash': transaction.transaction_hash})
     return web.json_response({'error': 'Invalid transaction data'}, status=400)
 
 async def receive_block_header(request):
@@ -571,7 +1240,7 @@ async def receive_block_header(request):
 
     # Verify the identity of the proposer through the included signature
     proposer_signature = find_proposer_signature(block_header)
-    if proposer_signature is None or not Wallet.verify_signature(block_header.block_hash, proposer_signature.signature_data, proposer_signature.validator_address):
+    if proposer_signature is None or not validation_engine.verify_block_signature(block_header, proposer_signature):
         logging.error("Invalid proposer signature received")
         return web.json_response({'error': 'Invalid proposer signature'}, status=400)
 
@@ -589,23 +1258,152 @@ async def receive_block_header(request):
 
 async def get_transaction_by_hash(request):
     transaction_hash = request.match_info['transaction_hash']
-    transaction_data = storage_engine.fetch_transaction(transaction_hash)
+    transaction_data = storage_engine.get_read_view().fetch_transaction(transaction_hash)
     if transaction_data is not None:
         return web.json_response(transaction_data)
     return web.json_response({'error': 'Block not found'}, status=404)
 
 async def get_block_by_hash(request):
     block_hash = request.match_info['block_hash']
-    block_data = storage_engine.fetch_block(block_hash)
+    block_data = storage_engine.get_read_view().fetch_block(block_hash)
     if block_data is not None:
         return web.json_response(block_data)
     return web.json_response({'error': 'Block not found'}, status=404)
 
 async def get_nonce(request):
     account_address = request.match_info['account_address']
-    nonce = storage_engine.get_nonce_for_account(account_address)
+    nonce = storage_engine.get_read_view().get_nonce_for_account(account_address)
     return web.json_response({'nonce': nonce})
 
+async def get_block_by_height(request):
+    try:
+        height = int(request.match_info['height'])
+        if not 0 <= height < HEIGHT_LIMIT:
+            raise ValueError
+    except ValueError:
+        return web.json_response({'error': 'Invalid block height'}, status=400)
+    block_data = storage_engine.get_read_view().fetch_block_by_height(height)
+    if block_data is not None:
+        return web.json_response(block_data)
+    return web.json_response({'error': 'Block not found'}, status=404)
+
+async def get_account_transactions(request):
+    account_address = request.match_info['account_address']
+    try:
+        limit = min(int(request.query.get('limit', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+        before = request.query.get('before')
+        before = tuple(int(part) for part in before.split(':')) if before else None
+        if limit <= 0 or (before is not None and len(before) != 2):
+            raise ValueError
+        if before is not None and not (0 <= before[0] < HEIGHT_LIMIT and 0 <= before[1] < TRANSACTION_INDEX_LIMIT):
+            raise ValueError
+    except ValueError:
+        return web.json_response({'error': 'Invalid pagination parameters'}, status=400)
+
+    read_view = storage_engine.get_read_view()
+    history = read_view.fetch_account_transactions(account_address, limit, before)
+    transactions = []
+    for height, transaction_index, transaction_hash in history:
+        transaction_data = read_view.fetch_transaction(transaction_hash)
+        if transaction_data is not None:
+            transactions.append(dict(transaction_data, transaction_index=transaction_index))
+    next_cursor = f"{history[-1][0]}:{history[-1][1]}" if len(history) == limit else None
+    return web.json_response({'transactions': transactions, 'next': next_cursor})
+
+async def get_transaction_proof(request):
+    transaction_hash = request.match_info['transaction_hash']
+    located = storage_engine.get_read_view().locate_transaction(transaction_hash)
+    if located is None:
+        return web.json_response({'error': 'Transaction not found'}, status=404)
+    block_header, transaction_index = located
+    levels = transaction_tree_levels(block_header.transaction_hashes)
+    return web.json_response({
+        'transaction_hash': transaction_hash,
+        'block_hash': block_header.block_hash,
+        'height': block_header.height,
+        'merkle_root': block_header.merkle_root,
+        'transaction_index': transaction_index,
+        'proof': transaction_proof(levels, transaction_index)
+    })
+
+async def get_transaction_proofs(request):
+    try:
+        data = await request.json()
+        transaction_hashes = data['transaction_hashes']
+        if not isinstance(transaction_hashes, list) or not all(isinstance(transaction_hash, str) for transaction_hash in transaction_hashes):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return web.json_response({'error': 'Invalid transaction hashes'}, status=400)
+    if len(transaction_hashes) > PROOF_MAX_BATCH_SIZE:
+        return web.json_response({'error': f'At most {PROOF_MAX_BATCH_SIZE} transactions per request'}, status=400)
+
+    # Transactions in the same block share one multiproof
+    read_view = storage_engine.get_read_view()
+    blocks = {}
+    missing = []
+    for transaction_hash in dict.fromkeys(transaction_hashes):
+        located = read_view.locate_transaction(transaction_hash)
+        if located is None:
+            missing.append(transaction_hash)
+            continue
+        block_header, transaction_index = located
+        blocks.setdefault(block_header.height, (block_header, {}))[1][transaction_hash] = transaction_index
+
+    block_proofs = []
+    for height in sorted(blocks):
+        block_header, transactions = blocks[height]
+        levels = transaction_tree_levels(block_header.transaction_hashes)
+        block_proofs.append({
+            'block_hash': block_header.block_hash,
+            'height': height,
+            'merkle_root': block_header.merkle_root,
+            'leaf_count': len(block_header.transaction_hashes),
+            'transactions': transactions,
+            'nodes': transaction_multiproof(levels, transactions.values())
+        })
+    return web.json_response({'blocks': block_proofs, 'missing': missing})
+
+async def get_account_proof(request):
+    account_address = request.match_info['account_address']
+    contract_address = request.query.get('contract', "6163636f756e7473")
+    read_view = storage_engine.get_read_view()
+    block_header = read_view.fetch_last_block_header()
+    if block_header is None:
+        return web.json_response({'error': 'State not available'}, status=404)
+    state_trie = read_view.state_tries.get(block_header.state_root)
+    if state_trie is None:
+        # An uncached trie is built from the whole state, so that runs off the event loop
+        state_trie = await asyncio.get_running_loop().run_in_executor(None, read_view.fetch_state_trie, block_header.state_root)
+    if state_trie is None:
+        return web.json_response({'error': 'State not available'}, status=404)
+    siblings, terminal = state_trie.prove(contract_address, account_address)
+    return web.json_response({
+        'contract_address': contract_address,
+        'key': account_address,
+        'value': to_plain(read_view.fetch_account(contract_address, account_address, block_header.state_root)),
+        'block_hash': block_header.block_hash,
+        'height': block_header.height,
+        'state_root': block_header.state_root,
+        'siblings': [sibling.hex() if sibling is not None else None for sibling in siblings],
+        'terminal': {'path': f"{terminal[0]:064x}", 'value_hash': terminal[1].hex()} if terminal is not None else None
+    })
+
+async def get_snapshot(request):
+    response = web.StreamResponse(headers={'Content-Type': 'application/octet-stream'})
+    response.enable_chunked_encoding()
+    chunks = storage_engine.export_snapshot()
+    loop = asyncio.get_running_loop()
+    try:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        await response.prepare(request)
+        while chunk is not None:
+            await response.write(chunk)
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+    finally:
+        chunks.close()
+    await response.write_eof()
+    return response
+
 def find_proposer_signature(block_header):
     for signature in block_header.signatures:
         if signature.validator_address == block_header.proposer:
@@ -616,15 +1414,35 @@ app.router.add_post('/send_transaction', send_transaction)
 app.router.add_get('/get_block/{block_hash}', get_block_by_hash)
 app.router.add_get('/transactions/{transaction_hash}', get_transaction_by_hash)
 app.router.add_get('/get_nonce/{account_address}', get_nonce)
+app.router.add_get('/get_block_by_height/{height}', get_block_by_height)
+app.router.add_get('/get_account_transactions/{account_address}', get_account_transactions)
+app.router.add_get('/snapshot', get_snapshot)
+app.router.add_get('/get_transaction_proof/{transaction_hash}', get_transaction_proof)
+app.router.add_post('/get_transaction_proofs', get_transaction_proofs)
+app.router.add_get('/get_account_proof/{account_address}', get_account_proof)
 app.router.add_post('/receive_block', receive_block_header)
 
 async def cleanup(app):
+    # The admission workers run until cancelled, so they are stopped before waiting on the other tasks
+    await admission_pipeline.stop()
     await asyncio.gather(*[t for t in asyncio.all_tasks() if t is not asyncio.current_task()])
     storage_engine.close()
 
 app.on_cleanup.append(cleanup)
 
 if __name__ == '__main__':
+    # Create instances of components. Spawned worker processes re-import this script
+    # as __mp_main__, so the node itself is only built when it runs as the main program
+    wallet = Wallet()
+    if not wallet.is_initialized():
+        logging.info("Wallet is not initialized. Please run wallet_generator.py to generate a wallet.")
+        exit()
+    transactionpool = TransactionPool(max_size=MAX_TX_POOL)
+    storage_engine = StorageEngine(transactionpool)
+    validation_engine = ValidationEngine(storage_engine)
+    forger = Forger(transactionpool, storage_engine, validation_engine, wallet)
+    admission_pipeline = AdmissionPipeline(storage_engine, validation_engine, transactionpool, workers=ADMISSION_WORKERS, queue_size=ADMISSION_QUEUE_SIZE, batch_size=ADMISSION_BATCH_SIZE)
+
     loop = asyncio.get_event_loop()
 
     app_runner = web.AppRunner(app)
@@ -634,8 +1452,13 @@ if __name__ == '__main__':
     loop.run_until_complete(site.start())
 
     storage_engine.open_databases()
+    logging.info(f"Signature backend: {crypto_backend.backend.name}")
+
+    admission_pipeline.start()
 
     loop.create_task(forger.check_round_robin_result())
+    if STATE_PRUNING_MODE == 'pruned':
+        loop.create_task(storage_engine.run_state_pruner())
 
     try:
         loop.run_forever()
@@ -1,15 +1,16 @@
-import ecdsa
-from ecdsa import VerifyingKey
 import time
 from blake3 import blake3
 import re
 
-from wallet import Wallet
 from block import Block, Signature
+from merkle_engine import transaction_merkle_root
+from signature_verifier import VerifiedSignatureCache
+from parameters import SIGNATURE_CACHE_MAX_ENTRIES, SIGNATURE_CACHE_MAX_AGE
 
 class ValidationEngine:
     def __init__(self, storage_engine):
         self.storage_engine = storage_engine
+        self.signature_cache = VerifiedSignatureCache(max_entries=SIGNATURE_CACHE_MAX_ENTRIES, max_age=SIGNATURE_CACHE_MAX_AGE)
 
     def is_valid_address(self, address):
         return bool(re.match(r'^[0-9a-fA-F]+$', address))
@@ -18,11 +19,26 @@ class ValidationEngine:
         return bool(re.match(r'^[0-9a-fA-F]+$', block_hash))
 
     def validate_transaction(self, transaction):
-
+        return self.validate_transactions([transaction])[0]
+
+    def validate_transactions(self, transactions, reader=None):
+        """Returns one bool per transaction; the signatures that need checking are verified as one batch.
+
+        Account state is read from reader, such as a read view, or from the storage engine by default.
+        """
+        results = [self.check_transaction(transaction, reader) for transaction in transactions]
+        pending = [index for index, valid in enumerate(results) if valid]
+        signatures_valid = self.signature_cache.verify_batch(self.transaction_signature_item(transactions[index]) for index in pending)
+        for index, valid in zip(pending, signatures_valid):
+            results[index] = valid
+        return results
+
+    def check_transaction(self, transaction, reader=None):
+        # Every check except the signature
         if transaction.fee <= 0:
             return False
 
-        balance, expected_nonce = self.storage_engine.get_nonce_for_account(transaction.sender)
+        sender_balance, expected_nonce = (reader or self.storage_engine).get_nonce_for_account(transaction.sender)
         if transaction.nonce != expected_nonce:
             return False
 
@@ -38,30 +54,25 @@ class ValidationEngine:
         if len(transaction.memo) > 256:
             return False
 
-        sender_balance = self.storage_engine.fetch_balance(transaction.sender)
-        if sender_balance is None or sender_balance < transaction.amount:
+        if sender_balance < transaction.amount:
             return False
 
-        if not self.verify_transaction_signature(transaction):
+        if not re.fullmatch(r'[0-9a-fA-F]+', transaction.signature):
+            print("Error: Invalid hexadecimal string for signature")
             return False
 
         return True
 
-    def verify_transaction_signature(self, transaction):
-        public_key = transaction.sender
-        signature = transaction.signature
-        vk = VerifyingKey.from_string(bytes.fromhex(public_key), curve=ecdsa.SECP256k1)
+    @staticmethod
+    def transaction_signature_item(transaction):
         message = f"{transaction.sender}-{transaction.receiver}-{transaction.amount}-{transaction.memo}-{transaction.fee}-{transaction.nonce}"
-        try:
-            if not re.fullmatch(r'[0-9a-fA-F]+', signature):
-                raise ValueError("Invalid hexadecimal string for signature")
-            vk.verify(bytes.fromhex(signature), message.encode())
-            return True
-        except ecdsa.BadSignatureError:
-            return False
-        except ValueError as e:
-            print(f"Error: {e}")
+        return transaction.sender, transaction.signature, message
+
+    def verify_transaction_signature(self, transaction):
+        if not re.fullmatch(r'[0-9a-fA-F]+', transaction.signature):
+            print("Error: Invalid hexadecimal string for signature")
             return False
+        return self.signature_cache.verify_batch([self.transaction_signature_item(transaction)])[0]
 
     def validate_block_header(self, block, previous_block_header):
         if not isinstance(block, Block):
@@ -97,33 +108,19 @@ class ValidationEngine:
             print(f"Block hash mismatch: {block.header.block_hash} != {computed_hash}")
             return False
 
-        # Merkle root computation debugging
         transaction_hashes = [t.to_dict()['transaction_hash'] for t in block.transactions]
-        print(f"Transaction hashes: {transaction_hashes}")
-
-        if len(transaction_hashes) == 0:
-            computed_merkle_root = blake3(b'').hexdigest()
-        else:
-            while len(transaction_hashes) > 1:
-                if len(transaction_hashes) % 2 != 0:
-                    transaction_hashes.append(transaction_hashes[-1])
-                transaction_hashes = [blake3(transaction_hashes[i].encode() + transaction_hashes[i + 1].encode()).digest() for i in range(0, len(transaction_hashes), 2)]
-            
-            if isinstance(transaction_hashes[0], str):
-                transaction_hashes[0] = transaction_hashes[0].encode('utf-8')
-            computed_merkle_root = blake3(transaction_hashes[0]).hexdigest()
+        computed_merkle_root = transaction_merkle_root(transaction_hashes)
 
         if block.header.merkle_root != computed_merkle_root:
             print(f"Merkle root mismatch: {block.header.merkle_root} != {computed_merkle_root}")
             return False
 
-        for signature in block.header.signatures:
-            if not Wallet.verify_signature(block.header.block_hash, signature.signature_data, signature.validator_address):
-                print(f"Invalid signature for block hash: {block.header.block_hash}")
-                return False
+        if not all(self.signature_cache.verify_batch(self.header_signature_items(block.header))):
+            print(f"Invalid signature for block hash: {block.header.block_hash}")
+            return False
 
-        for transaction in block.header.transactions:
-            if not self.validate_transaction(transaction):
+        for transaction, valid in zip(block.transactions, self.validate_transactions(block.transactions)):
+            if not valid:
                 print(f"Invalid transaction in block: {transaction}")
                 return False
 
@@ -135,22 +132,31 @@ class ValidationEngine:
 
 
     def validate_block_header_signatures(self, block_header):
-        for signature in block_header.signatures:
-            if not Wallet.verify_signature(block_header.block_hash, signature.signature_data, signature.validator_address):
-                return False
-            if signature.validator_index is None:
-                return False
-        return True
+        if any(signature.validator_index is None for signature in block_header.signatures):
+            return False
+        return all(self.signature_cache.verify_batch(self.header_signature_items(block_header)))
+
+    def verify_block_signature(self, block_header, signature):
+        return self.signature_cache.verify_batch([(signature.validator_address, signature.signature_data, block_header.block_hash)])[0]
+
+    @staticmethod
+    def header_signature_items(block_header):
+        return [(signature.validator_address, signature.signature_data, block_header.block_hash) for signature in block_header.signatures]
+
+    def forget_block_signatures(self, block):
+        # A committed block's transactions and header are never verified again
+        for transaction in block.transactions:
+            self.signature_cache.discard(self.transaction_signature_item(transaction))
+        for item in self.header_signature_items(block.header):
+            self.signature_cache.discard(item)
 
     def validate_enough_signatures(self, block_header, required_signatures):
         return len(block_header.signatures) >= required_signatures
 
     def validate_round_robin_proposer(self, current_proposer, previous_proposer):
-        validator_set = self.storage_engine.fetch_contract_state("7374616b696e67")
+        validator_set = self.storage_engine.fetch_validator_set()
         if validator_set:
-            sorted_validators = sorted(validator_set.keys(), key=lambda k: validator_set[k]['index'])
-            previous_index = sorted_validators.index(previous_proposer)
-            expected_proposer = sorted_validators[(previous_index + 1) % len(sorted_validators)]
+            expected_proposer = validator_set.next_proposer(previous_proposer)
             print(f"Expected proposer: {expected_proposer}, Current proposer: {current_proposer}")
             return current_proposer == expected_proposer
         print("No validators found in the current validator set")
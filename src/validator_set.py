@@ -0,0 +1,46 @@
+STAKING_CONTRACT_ADDRESS = "7374616b696e67"  # 'staking' in hex
+
+class ValidatorSet:
+    """The staking contract's validators at one state root, in staking index order.
+
+    Built once per staking contract state and shared by every state root that
+    leaves the staking contract unchanged, so it must not be modified.
+    """
+
+    __slots__ = ('validators', 'indexes', 'positions', 'quorum')
+
+    def __init__(self, stake_entries):
+        self.validators = sorted(stake_entries, key=lambda address: stake_entries[address].index)
+        self.indexes = {address: stake_entry.index for address, stake_entry in stake_entries.items()}
+        self.positions = {address: position for position, address in enumerate(self.validators)}
+        # Smallest signature count that is at least two thirds of the validators
+        self.quorum = -(-2 * len(self.validators) // 3)
+
+    def __len__(self):
+        return len(self.validators)
+
+    def __iter__(self):
+        return iter(self.validators)
+
+    def __getitem__(self, position):
+        return self.validators[position]
+
+    def __contains__(self, address):
+        return address in self.indexes
+
+    def index_of(self, address):
+        """Returns the validator's staking index, or -1 for an address that is not staked."""
+        return self.indexes.get(address, -1)
+
+    def has_quorum(self, signature_count):
+        return signature_count >= self.quorum
+
+    def next_proposer(self, previous_proposer):
+        """Returns the validator after previous_proposer in round-robin order.
+
+        A previous proposer outside the set, such as the genesis proposer, is followed by the first validator.
+        """
+        if not self.validators:
+            return None
+        position = self.positions.get(previous_proposer)
+        return self.validators[0] if position is None else self.validators[(position + 1) % len(self.validators)]
@@ -1,14 +1,38 @@
 import logging
-from parameters import BLOCK_REWARD
-from merkle_tree import MerkleTree
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from parameters import BLOCK_REWARD, VM_EXECUTION_MODE, VM_PARALLEL_WORKERS, VM_PARALLEL_MIN_TRANSACTIONS, VM_METERING
+from state import WorldState, StateOverlay
+from metering import MeteredOverlay, ExecutionTrace
+from state_trie import StateTrie
+from records import Account, StakeEntry
 
 tinycoin = 1000000000000000000  # 1 tinycoin = 1000000000000000000 tatoshi
 BLOCK_REWARD = BLOCK_REWARD * tinycoin
 
+# Staking writes depend on how many stakers exist, so every staking transaction conflicts
+STAKING_SET = "staking"
+
+executor = None
+
+def get_executor():
+    global executor
+    if executor is None:
+        # Spawned workers also re-import the main script as __mp_main__, so entry points keep their setup under a __main__ guard
+        executor = ProcessPoolExecutor(max_workers=VM_PARALLEL_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return executor
+
+def execute_batch(entries, transactions):
+    """Runs in a worker: executes transactions over a {contract_address: {key: value}} copy of what they touch."""
+    state = StateOverlay(entries)
+    summary = TinyVMEngine(entries).execute_transactions(state, transactions)
+    return list(state.writes.items()), summary
+
 class TinyVMEngine:
     def __init__(self, current_state):
-        self.merkle_tree = MerkleTree()
         self.current_state = current_state
+        self.state_trie = None
+        self.trace = None
 
         ### System Contracts ###
         self.accounts_contract_address = "6163636f756e7473"
@@ -16,18 +40,41 @@ class TinyVMEngine:
         self.storage_contract_address = "73746f72616765"  # 'storage' in hex
 
     def exec(self, transactions, proposer):
-        accounts_contract_state = self.current_state.get(self.accounts_contract_address, {"genesis": {"balance": 60000 * tinycoin, "nonce": 0}})
-        staking_contract_state = self.current_state.get(self.staking_contract_address, {})
-
-        summary = {"success": 0, "failed": 0}
+        """Returns (state_root, new_state). With VM_METERING on, self.trace holds the block's ExecutionTrace."""
+        meter = ExecutionTrace(proposer) if VM_METERING else None
+        # Writes go to an overlay, so the parent state can be executed on again
+        state = StateOverlay(self.current_state) if meter is None else MeteredOverlay(self.current_state)
+        if not isinstance(self.current_state, (WorldState, StateOverlay)) and self.accounts_contract_address not in self.current_state:
+            state.set(self.accounts_contract_address, "genesis", Account(60000 * tinycoin, 0))
 
         # Reward proposer (if not genesis block)
         if proposer != "genesis":
-            accounts_contract_state = self.execute_accounts_contract(
-                accounts_contract_state, proposer, None, BLOCK_REWARD, "credit"
-            )
+            self.execute_accounts_contract(state, proposer, None, BLOCK_REWARD, "credit")
+        if meter is not None:
+            meter.mark('reward')
+
+        # Metered blocks run in process, where per-transaction timings are comparable
+        if VM_EXECUTION_MODE == 'parallel' and meter is None and len(transactions) >= VM_PARALLEL_MIN_TRANSACTIONS:
+            summary = self.execute_parallel(state, transactions)
+        else:
+            summary = self.execute_transactions(state, transactions, meter)
+        if meter is not None:
+            meter.mark('transactions')
+
+        state.commit()
+        state_root = self.compute_state_root(state)
+        if meter is not None:
+            meter.mark('state_root')
+            meter.record_state_changes(state.changes())
+            self.trace = meter
 
-        # Process each transaction
+        # Log summary result
+        logging.info(f"TinyVM: Execution Summary - Success: {summary['success']}, Failed: {summary['failed']}")
+
+        return state_root, state
+
+    def execute_transactions(self, state, transactions, meter=None):
+        summary = {"success": 0, "failed": 0}
         for transaction in transactions:
             sender, receiver, amount, memo = (
                 transaction.sender,
@@ -35,94 +82,185 @@ class TinyVMEngine:
                 transaction.amount,
                 transaction.memo,
             )
+            if meter is not None:
+                meter.start_transaction(state)
 
-            success = self.process_transaction(
-                accounts_contract_state, staking_contract_state, sender, receiver, amount, memo
-            )
+            checkpoint = state.checkpoint()
+            success = self.process_transaction(state, sender, receiver, amount, memo)
             if success:
                 summary["success"] += 1
             else:
+                state.revert(checkpoint)
                 summary["failed"] += 1
 
-        # Final state update
-        state = {
-            self.accounts_contract_address: accounts_contract_state,
-            self.staking_contract_address: staking_contract_state,
-        }
+            # Every included transaction consumes the sender's nonce, not only successful transfers
+            self.advance_nonce(state, sender, transaction.nonce)
+            if meter is not None:
+                meter.stop_transaction(state, transaction, self.transaction_contract(transaction), success)
+        return summary
 
-        # Calculate the Merkle root
-        state_root = self.merkle_tree.root_hash().hex()
+    def transaction_contract(self, transaction):
+        return self.staking_contract_address if transaction.receiver == self.staking_contract_address else self.accounts_contract_address
 
-        # Log summary result
-        logging.info(f"TinyVM: Execution Summary - Success: {summary['success']}, Failed: {summary['failed']}")
+    def transaction_keys(self, transaction):
+        """Returns the state entries a transaction may read or write."""
+        keys = [(self.accounts_contract_address, transaction.sender), (self.accounts_contract_address, transaction.receiver)]
+        if transaction.receiver == self.staking_contract_address:
+            keys.append((self.staking_contract_address, STAKING_SET))
+        return keys
 
-        return state_root, state
+    def conflict_groups(self, transactions):
+        """Partitions transactions into groups that share no state entries, each in block order.
+
+        Groups are ordered by their first transaction, so the partition is deterministic.
+        """
+        parents = {}
+
+        def find(key):
+            parents.setdefault(key, key)
+            while parents[key] != key:
+                parents[key] = parents[parents[key]]
+                key = parents[key]
+            return key
+
+        transaction_keys = [self.transaction_keys(transaction) for transaction in transactions]
+        for keys in transaction_keys:
+            root = find(keys[0])
+            for key in keys[1:]:
+                other = find(key)
+                if other != root:
+                    parents[other] = root
+
+        groups = {}
+        for transaction, keys in zip(transactions, transaction_keys):
+            groups.setdefault(find(keys[0]), []).append(transaction)
+        return list(groups.values())
+
+    def read_entries(self, state, transactions):
+        entries = {}
+        for transaction in transactions:
+            for contract_address, key in self.transaction_keys(transaction):
+                contract_entries = entries.setdefault(contract_address, {})
+                if key == STAKING_SET and contract_address == self.staking_contract_address:
+                    # New stakes are indexed by the number of stakers, so the worker needs all of them
+                    for staker in state.contract_keys(contract_address):
+                        contract_entries[staker] = state.get(contract_address, staker)
+                elif key not in contract_entries:
+                    value = state.get(contract_address, key)
+                    if value is not None:
+                        contract_entries[key] = value
+        return entries
+
+    def execute_parallel(self, state, transactions):
+        # Groups are packed into one batch per worker, largest first; batches touch disjoint
+        # entries, so applying their writes in batch order gives the sequential result
+        groups = sorted(self.conflict_groups(transactions), key=len, reverse=True)
+        batches = [[] for _ in range(min(VM_PARALLEL_WORKERS, len(groups)))]
+        for group in groups:
+            min(batches, key=len).extend(group)
+        positions = {id(transaction): index for index, transaction in enumerate(transactions)}
+        futures = []
+        for batch in batches:
+            batch.sort(key=lambda transaction: positions[id(transaction)])
+            futures.append(get_executor().submit(execute_batch, self.read_entries(state, batch), batch))
+
+        summary = {"success": 0, "failed": 0}
+        for future in futures:
+            writes, batch_summary = future.result()
+            for (contract_address, key), value in writes:
+                state.set(contract_address, key, value)
+            summary["success"] += batch_summary["success"]
+            summary["failed"] += batch_summary["failed"]
+        return summary
+
+    def compute_state_root(self, state):
+        # Only the entries this block changed are rehashed into the parent's trie
+        base_state = state.base_state()
+        if isinstance(base_state, WorldState):
+            parent_trie = base_state.state_trie()
+        else:
+            parent_trie = StateTrie.from_entries(((contract_address, key), value) for contract_address, entries in base_state.items() for key, value in entries.items())
+        self.state_trie = parent_trie.update(state.changes())
+        return self.state_trie.root_hash().hex()
 
-    def process_transaction(self, accounts_state, staking_state, sender, receiver, amount, memo):
+    def process_transaction(self, state, sender, receiver, amount, memo):
         """Handles a single transaction and returns True on success, False on failure."""
         if receiver == self.staking_contract_address and memo in ("stake", "unstake"):
             is_stake = memo == "stake"
-            staking_state, accounts_state = self.execute_staking_contract(
-                staking_state, sender, amount, is_stake, accounts_state
-            )
+            self.execute_staking_contract(state, sender, amount, is_stake)
             return True
         elif memo not in ("stake", "unstake") and receiver == self.staking_contract_address:
             logging.info(f"TinyVM: Invalid memo '{memo}'. Use 'stake' or 'unstake'.")
             return False
 
         # Execute regular transfer
-        return self.execute_accounts_contract(accounts_state, sender, receiver, amount, "transfer") is not None
+        return self.execute_accounts_contract(state, sender, receiver, amount, "transfer")
+
+    def get_account(self, state, address):
+        return state.get(self.accounts_contract_address, address) or Account()
 
-    def execute_accounts_contract(self, contract_state, sender, receiver, amount, operation):
+    def write_account(self, state, address, balance, nonce):
+        # Accounts are replaced, never mutated, since the parent state shares them
+        state.set(self.accounts_contract_address, address, Account(balance, nonce))
+
+    def advance_nonce(self, state, sender, nonce):
+        account = state.get(self.accounts_contract_address, sender)
+        if account is not None and account.nonce <= nonce:
+            self.write_account(state, sender, account.balance, nonce + 1)
+
+    def execute_accounts_contract(self, state, sender, receiver, amount, operation):
 
         if operation == "credit":
-            contract_state[sender]["balance"] = contract_state.get(sender, {"balance": 0, "nonce": 0})["balance"] + amount
+            account = self.get_account(state, sender)
+            self.write_account(state, sender, account.balance + amount, account.nonce)
         elif operation == "transfer":
-            sender_balance = contract_state.get(sender, {"balance": 0, "nonce": 0})["balance"]
-            receiver_balance = contract_state.get(receiver, {"balance": 0, "nonce": 0})["balance"]
+            sender_account = self.get_account(state, sender)
+            # Read before the sender is debited, so a transfer to oneself keeps its historical result
+            receiver_balance = self.get_account(state, receiver).balance
 
-            if sender_balance >= amount:
-                contract_state[sender]["balance"] = sender_balance - amount
-                if receiver not in contract_state:
+            if sender_account.balance >= amount:
+                self.write_account(state, sender, sender_account.balance - amount, sender_account.nonce)
+                receiver_account = state.get(self.accounts_contract_address, receiver)
+                if receiver_account is None:
                     logging.info(f"TinyVM: Receiver {receiver} not found in contract state. Adding receiver to contract state.")
-                    contract_state[receiver] = {"balance": 0, "nonce": 0}
-                contract_state[receiver]["balance"] = receiver_balance + amount
-                contract_state[sender]["nonce"] += 1
+                    receiver_account = Account()
+                self.write_account(state, receiver, receiver_balance + amount, receiver_account.nonce)
+                sender_account = self.get_account(state, sender)
+                self.write_account(state, sender, sender_account.balance, sender_account.nonce + 1)
             else:
                 logging.info(f"TinyVM: Insufficient balance for sender: {sender}")
-                return None  # Transaction failed
+                return False  # Transaction failed
 
-        self.merkle_tree.append(bytes(str(contract_state), "utf-8"))
-        return contract_state
+        return True
 
-    def execute_staking_contract(self, contract_state, sender, amount, is_stake, accounts_state):
-        if contract_state is None:
-            contract_state = {}
-
-        staked_balance = contract_state.get(sender, {"balance": 0, "status": "active", "index": len(contract_state)})
+    def execute_staking_contract(self, state, sender, amount, is_stake):
+        staked_entry = state.get(self.staking_contract_address, sender)
+        if staked_entry is not None:
+            staked_balance = StakeEntry(staked_entry.balance, staked_entry.status, staked_entry.index)
+        else:
+            staked_balance = StakeEntry(0, "active", len(state.contract_keys(self.staking_contract_address)))
 
         if is_stake:
-            sender_balance = accounts_state.get(sender, {"balance": 0, "nonce": 0})["balance"]
-            if sender_balance >= amount:
-                staked_balance["balance"] += amount
-                staked_balance["status"] = "active"
-                accounts_state[sender]["balance"] = sender_balance - amount
+            sender_account = self.get_account(state, sender)
+            if sender_account.balance >= amount:
+                staked_balance.balance += amount
+                staked_balance.status = "active"
+                self.write_account(state, sender, sender_account.balance - amount, sender_account.nonce)
             else:
                 logging.info(f"TinyVM: Insufficient balance for staking by {sender}.")
-                return contract_state, accounts_state  # No change
+                return False  # No change
         else:
-            if staked_balance["balance"] > 0:
-                released_balance = staked_balance["balance"]
-                staked_balance["balance"] = 0
-                staked_balance["status"] = "inactive"
+            if staked_balance.balance > 0:
+                released_balance = staked_balance.balance
+                staked_balance.balance = 0
+                staked_balance.status = "inactive"
 
                 self.execute_accounts_contract(
-                    accounts_state, self.staking_contract_address, sender, released_balance, "transfer"
+                    state, self.staking_contract_address, sender, released_balance, "transfer"
                 )
             else:
                 logging.info(f"TinyVM: No staked tinycoins to unstake for {sender}.")
-                return contract_state, accounts_state  # No change
+                return False  # No change
 
-        contract_state[sender] = staked_balance
-        self.merkle_tree.append(bytes(str(contract_state), "utf-8"))
-        return contract_state, accounts_state
+        state.set(self.staking_contract_address, sender, staked_balance)
+        return True
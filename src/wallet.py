@@ -1,7 +1,8 @@
-import ecdsa
 import pickle
 import os
 import logging
+from crypto_backend import backend
+from signature_verifier import verify_signature
 
 WALLET_PATH = './wallet/'
 
@@ -10,7 +11,7 @@ class Wallet:
         try:
             with open(os.path.join(WALLET_PATH, "wallet.dat"), "rb") as file:
                 private_key = pickle.load(file)
-                signature = private_key.sign(message.encode()).hex()
+                signature = backend.sign(private_key, message.encode()).hex()
                 return signature
         except Exception as e:
             logging.error(f"Failed to sign message: {e}")
@@ -28,15 +29,7 @@ class Wallet:
 
     @staticmethod
     def verify_signature(message, signature, public_key_hex):
-        try:
-            public_key = ecdsa.VerifyingKey.from_string(bytes.fromhex(public_key_hex), curve=ecdsa.SECP256k1)
-            message = message.encode()
-            return public_key.verify(bytes.fromhex(signature), message)
-        except ecdsa.BadSignatureError:
-            return False
-        except Exception as e:
-            logging.error(f"Failed to verify signature: {e}")
-            return False
+        return verify_signature(public_key_hex, signature, message)
 
     def is_initialized(self):
         return os.path.exists(os.path.join(WALLET_PATH, "wallet.dat"))